@@ -0,0 +1,2 @@
+# Performance benchmarks for the backend. Run from backend/, e.g.:
+#   python -m benchmarks.bench_batching
@@ -0,0 +1,75 @@
+"""
+Accuracy / latency report for the inference backends in inference_backends.py.
+
+Every backend generates flashcards for held-out notes from the end of
+triviaqa_notes_generated.json, one note per request like /generate with a single
+section. Reports BLEU against the reference "Q: ...\nA: ..." targets and p50/p95
+latency, as JSON.
+
+Usage: python -m benchmarks.bench_backends [model_dir] [num_notes] [backend ...]
+"""
+
+import json
+import sys
+import time
+
+import evaluate
+import torch
+from transformers import T5Tokenizer
+
+from inference_backends import BACKENDS, load_backend
+
+DATA_PATH = "triviaqa_notes_generated.json"
+
+
+def load_held_out(num_notes):
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [(item["note"], f"Q: {item['question']}\nA: {item['answer']}") for item in data[-num_notes:]]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run_backend(name, model_dir, tokenizer, examples):
+    device = torch.device("cpu")
+    load_start = time.perf_counter()
+    model = load_backend(name, model_dir, device)
+    load_seconds = time.perf_counter() - load_start
+
+    predictions, latencies = [], []
+    with torch.no_grad():
+        for note, _ in examples:
+            start = time.perf_counter()
+            encoding = tokenizer(note, return_tensors="pt", truncation=True, max_length=256)
+            output = model.generate(**encoding, max_length=64)
+            predictions.append(tokenizer.decode(output[0], skip_special_tokens=True).strip())
+            latencies.append(time.perf_counter() - start)
+
+    metric = evaluate.load("sacrebleu")
+    bleu = metric.compute(predictions=predictions, references=[[target] for _, target in examples])["score"]
+    return {
+        "backend": name,
+        "load_s": load_seconds,
+        "bleu": bleu,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "notes_per_s": len(latencies) / sum(latencies),
+    }
+
+
+def main():
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "finetuned_flan_t5_flashcards_v2"
+    num_notes = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    backends = sys.argv[3:] or list(BACKENDS)
+
+    tokenizer = T5Tokenizer.from_pretrained(model_dir)
+    examples = load_held_out(num_notes)
+    report = [run_backend(name, model_dir, tokenizer, examples) for name in backends]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
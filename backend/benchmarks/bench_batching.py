@@ -0,0 +1,50 @@
+"""
+Compares per-section flashcard generation against the batched path
+on notes from triviaqa_notes_generated.json.
+
+Usage: python -m benchmarks.bench_batching [num_notes] [max_batch_size]
+"""
+
+import json
+import sys
+import time
+
+import main_backend
+
+DATA_PATH = "triviaqa_notes_generated.json"
+
+
+def load_notes(num_notes):
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [item["note"] for item in data[:num_notes]]
+
+
+def time_it(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    num_notes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    max_batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else main_backend.MAX_BATCH_SIZE
+    notes = load_notes(num_notes)
+
+    # Warm up so the first timed run doesn't pay one-off costs
+    main_backend.generate_flashcards_batch(notes[:2], max_batch_size=max_batch_size)
+
+    sequential = time_it(lambda: [main_backend.generate_flashcard(n) for n in notes])
+    stats = {}
+    batched = time_it(lambda: main_backend.generate_flashcards_batch(notes, max_batch_size=max_batch_size, stats=stats))
+
+    print(f"Notes: {len(notes)}  max_batch_size: {max_batch_size}  device: {main_backend.device}")
+    print(f"Per-section: {sequential:.2f}s  ({len(notes) / sequential:.1f} notes/s)")
+    print(f"Batched:     {batched:.2f}s  ({len(notes) / batched:.1f} notes/s)")
+    print(f"Speedup:     {sequential / batched:.2f}x")
+    print(f"Encoder tokens: {stats['real_tokens']} real / {stats['padded_tokens']} padded "
+          f"/ {stats['max_length_tokens']} if padded to max_length")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Time of hand_to_text.clean_extracted_text vs the line-by-line version it replaced,
+on large synthetic OCR outputs: preamble on the first line, a preamble-like phrase in
+the last line of the note (which the old version dropped everything up to, and the new
+one keeps), none (fallback regexes), and re-cleaning already-cleaned text as /review
+used to. Outputs are checked against the old implementation where it was already right.
+
+Usage: python -m benchmarks.bench_clean [lines]
+"""
+
+import json
+import re
+import sys
+import timeit
+
+from hand_to_text import CLEAN_RULES_PATH, clean_extracted_text, text_cleaner
+
+with open(CLEAN_RULES_PATH, encoding="utf-8") as f:
+    OLD_DROP_PHRASES = json.load(f)["drop_phrases"]
+
+
+def old_clean_extracted_text(raw_text):
+    lines = raw_text.strip().splitlines()
+    for i, line in enumerate(lines):
+        for phrase in OLD_DROP_PHRASES:
+            if phrase.lower() in line.lower():
+                return "\n".join(lines[i + 1:]).strip()
+    cleaned = re.sub(r"^```(?:\w+)?|```$", "", raw_text, flags=re.MULTILINE)
+    cleaned = re.sub(r"(?i)^.*?(generated|transcribed|extracted) (text|content):", "", cleaned)
+    return cleaned.strip()
+
+
+def make_text(lines, preamble_at=None):
+    body = [f"Line {i}: the derivative of x squared is two x, summation over i of x sub i." for i in range(lines)]
+    if preamble_at is not None:
+        body.insert(preamble_at, "Sure, here is the extracted text from your handwritten note:")
+    return "\n".join(body)
+
+
+def best_ms(fn, text, number=5):
+    return min(timeit.repeat(lambda: fn(text), number=1, repeat=number)) * 1000
+
+
+def clean_uncached(text):
+    # Forget recent outputs first, so the new cleaner does the full work every time
+    text_cleaner._clean_outputs.clear()
+    return clean_extracted_text(text)
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = {
+        "preamble_first_line": make_text(lines, 0),
+        "phrase_in_last_line": make_text(lines, lines - 1),
+        "no_preamble": "```text\n" + make_text(lines) + "\n```",
+    }
+    report = {"lines": lines}
+    for name, text in cases.items():
+        cleaned = clean_extracted_text(text)
+        if name == "phrase_in_last_line":
+            assert cleaned == text.strip(), name
+        else:
+            assert cleaned == old_clean_extracted_text(text), name
+        report[name] = {
+            "old_ms": best_ms(old_clean_extracted_text, text),
+            "new_ms": best_ms(clean_uncached, text),
+            "old_second_call_ms": best_ms(old_clean_extracted_text, cleaned),
+            "new_second_call_ms": best_ms(clean_extracted_text, cleaned),
+            "new_second_call_uncached_ms": best_ms(clean_uncached, cleaned),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
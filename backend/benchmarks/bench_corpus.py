@@ -0,0 +1,88 @@
+"""
+Load time and peak RSS of reading a corpus three ways: json.load of a JSON array (what
+the scripts did before corpus.py), streaming the same JSON array with
+corpus.iter_records, and streaming the JSONL version of it.
+
+Each reader runs in a fresh process so peak RSS isn't polluted by the others; the
+reported peak is the increase over that process's RSS just before reading.
+A synthetic corpus of the given size is written first, unless a path is given.
+
+Usage: python -m benchmarks.bench_corpus [num_records] [corpus.json]
+"""
+
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import corpus
+
+
+def make_synthetic(path, num_records):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(num_records):
+            record = {
+                "note": f"Note {i}: the mitochondria is the powerhouse of cell number {i}, discovered in {1800 + i % 200}.",
+                "target": f"Q: What is the powerhouse of cell number {i}?\nA: The mitochondria",
+            }
+            f.write(("," if i else "") + json.dumps(record) + "\n")
+        f.write("]\n")
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _json_load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return sum(1 for item in data if corpus.normalize_record(item))
+
+
+def _stream(path):
+    return sum(1 for _ in corpus.iter_records(path))
+
+
+def _measure(reader, path, results):
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    count = reader(path)
+    results.put({"records": count, "load_s": time.perf_counter() - start,
+                 "peak_rss_mb": _peak_rss_mb(), "peak_rss_increase_mb": _peak_rss_mb() - baseline})
+
+
+def measure(reader, path):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(reader, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tmp, "corpus.json")
+        if len(sys.argv) <= 2:
+            make_synthetic(json_path, num_records)
+        jsonl_path = os.path.join(tmp, "corpus.jsonl")
+        corpus.convert(json_path, jsonl_path, schema="target")
+
+        report = {
+            "json_bytes": os.path.getsize(json_path),
+            "jsonl_bytes": os.path.getsize(jsonl_path),
+            "json_load": measure(_json_load, json_path),
+            "stream_json_array": measure(_stream, json_path),
+            "stream_jsonl": measure(_stream, jsonl_path),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
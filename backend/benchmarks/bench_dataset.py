@@ -0,0 +1,73 @@
+"""
+Epoch wall-clock of the training input pipeline on triviaqa_notes_generated.json:
+FlashcardDataset (tokenizes on every access) vs PretokenizedFlashcardDataset
+(memory-mapped token ids), with 0 and num_workers DataLoader workers.
+
+If a model directory is given, each epoch also runs the forward/backward pass, so
+the numbers show how much of a real training epoch the input pipeline accounts for.
+
+Usage: python -m benchmarks.bench_dataset <tokenizer_name> [model_dir] [num_workers]
+"""
+
+import json
+import sys
+import time
+
+from torch.optim import AdamW
+from torch.utils.data import DataLoader
+from transformers import T5ForConditionalGeneration
+
+from flashcard_data import FlashcardDataset, PretokenizedFlashcardDataset, ensure_pretokenized
+
+DATA_PATH = "triviaqa_notes_generated.json"
+PREFIX = "triviaqa_notes_generated.tok"
+BATCH_SIZE = 4
+
+
+def run_epoch(dataset, num_workers, model=None, pad_token_id=0):
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=num_workers)
+    optimizer = AdamW(model.parameters(), lr=5e-5) if model is not None else None
+    start = time.perf_counter()
+    for batch in loader:
+        if model is None:
+            continue
+        labels = batch["labels"].clone()
+        labels[labels == pad_token_id] = -100
+        loss = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"], labels=labels).loss
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    return time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    tokenizer_name = sys.argv[1]
+    model_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    start = time.perf_counter()
+    ensure_pretokenized(DATA_PATH, tokenizer_name, PREFIX)
+    pretokenize_seconds = time.perf_counter() - start
+
+    original = FlashcardDataset(DATA_PATH, tokenizer_name=tokenizer_name)
+    pretokenized = PretokenizedFlashcardDataset(PREFIX)
+    model = T5ForConditionalGeneration.from_pretrained(model_dir) if model_dir else None
+
+    report = {
+        "examples": len(pretokenized),
+        "pretokenize_s": pretokenize_seconds,
+        "includes_training": model is not None,
+        "epoch_s": {
+            "tokenize_on_access": run_epoch(original, 0, model, pretokenized.pad_token_id),
+            "pretokenized": run_epoch(pretokenized, 0, model, pretokenized.pad_token_id),
+            f"pretokenized_{num_workers}_workers": run_epoch(pretokenized, num_workers, model, pretokenized.pad_token_id),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
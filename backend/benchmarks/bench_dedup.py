@@ -0,0 +1,78 @@
+"""
+Timing and accuracy of dedup.DedupIndex on synthetic flashcard pairs.
+
+Each synthetic corpus has random questions, and a share of records repeat an earlier
+question/answer under a different note template, like the TriviaQA-derived corpora.
+Reports seconds spent on signatures and LSH clustering, and precision/recall of the
+found duplicates against the planted ones.
+
+Usage: python -m benchmarks.bench_dedup [sizes] [fields]
+    e.g. python -m benchmarks.bench_dedup 10000,100000,1000000 question,answer
+"""
+
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from dedup import DedupIndex, duplicate_clusters
+
+DUPLICATE_RATE = 0.3
+TEMPLATES = [
+    'The answer to the question "{q}" is {a}.',
+    "{a} is the answer when asked {q}",
+    "Remember for the exam: {q} {a}.",
+]
+
+
+def synthetic_records(n, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(5000)]
+    records, origin = [], []
+    for i in range(n):
+        if records and rng.random() < DUPLICATE_RATE:
+            source = rng.randrange(len(records))
+            question, answer = records[source]["question"], records[source]["answer"]
+            origin.append(origin[source])
+        else:
+            question = " ".join(rng.choices(vocab, k=rng.randint(6, 14))) + "?"
+            answer = " ".join(rng.choices(vocab, k=rng.randint(1, 3)))
+            origin.append(i)
+        note = rng.choice(TEMPLATES).format(q=question, a=answer)
+        records.append({"note": note, "question": question, "answer": answer})
+    return records, np.array(origin)
+
+
+def run(n, fields):
+    records, origin = synthetic_records(n)
+    index = DedupIndex(fields)
+    start = time.perf_counter()
+    for block_start in range(0, n, 2000):
+        index.add(records[block_start:block_start + 2000])
+    roots = index.find_clusters()
+    total = time.perf_counter() - start
+
+    found = roots != np.arange(n)
+    planted = origin != np.arange(n)
+    true_positives = int((found & planted).sum())
+    return {
+        "records": n,
+        "total_s": total,
+        "timings": index.timings,
+        "records_per_s": n / total,
+        "duplicate_clusters": len(duplicate_clusters(roots)),
+        "precision": true_positives / max(int(found.sum()), 1),
+        "recall": true_positives / max(int(planted.sum()), 1),
+    }
+
+
+def main():
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "10000,100000,1000000").split(",")]
+    fields = tuple((sys.argv[2] if len(sys.argv) > 2 else "question,answer").split(","))
+    print(json.dumps([run(n, fields) for n in sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
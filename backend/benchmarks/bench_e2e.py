@@ -0,0 +1,210 @@
+"""
+End-to-end load test of the Flask backend over HTTP.
+
+The app is served in a separate process with a small random-weight T5 (built from the
+configured model's tokenizer, so no real checkpoint is needed) and a stub in place of
+describe_image_with_gpt4, so no API key or network is involved. Requests made of a few
+notes from triviaqa_notes_generated.json are replayed through /generate?text= by
+concurrent clients, once per concurrency level. With --ocr, requests go through the
+stubbed OCR and clean_extracted_text instead of passing the text directly.
+
+Reports throughput, latency percentiles and the server's peak RSS as JSON, together with
+the commit and settings, so runs on different commits can be compared directly.
+FLASHCARDS_* settings in the environment are passed through to the server; the
+flashcard cache is disabled unless --cache is given, so every request runs the model.
+
+Usage: python -m benchmarks.bench_e2e [--concurrency 1,4,8] [--requests 64] [--output e2e.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DATA_PATH = "triviaqa_notes_generated.json"
+OCR_PREAMBLE = "Sure! Here is the text extracted from the image:\n\n"
+
+
+def make_random_t5(tokenizer_dir, out_dir, d_model=128, num_layers=2, seed=0):
+    """Saves a T5 with random weights and the tokenizer from tokenizer_dir to out_dir."""
+    import torch
+    from transformers import T5Config, T5ForConditionalGeneration, T5Tokenizer
+    tokenizer = T5Tokenizer.from_pretrained(tokenizer_dir)
+    config = T5Config(vocab_size=len(tokenizer), d_model=d_model, d_kv=d_model // 4, d_ff=d_model * 4,
+                      num_layers=num_layers, num_heads=4, decoder_start_token_id=tokenizer.pad_token_id,
+                      pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id)
+    torch.manual_seed(seed)
+    model = T5ForConditionalGeneration(config)
+    model.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+    return model.num_parameters()
+
+
+def make_request_texts(num_requests, notes_per_request, seed=0):
+    from corpus import iter_records
+    notes = [record["note"] for record in iter_records(DATA_PATH)]
+    rng = random.Random(seed)
+    return ["\n\n".join(rng.sample(notes, notes_per_request)) for _ in range(num_requests)]
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _serve(model_dir, page_texts, ocr_seconds, ready, stop, results):
+    # Runs in the server process: swap in the model and the OCR stub, warm up, serve until told to stop
+    from werkzeug.serving import make_server
+    import main_backend
+
+    def stub_describe_image(filepath):
+        time.sleep(ocr_seconds)
+        return OCR_PREAMBLE + page_texts[int(os.path.splitext(os.path.basename(filepath))[0].split("-")[1])]
+
+    main_backend.model_dir = model_dir
+    main_backend.describe_image_with_gpt4 = stub_describe_image
+    main_backend.warm_up()
+    server = make_server("127.0.0.1", 0, main_backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put({"port": server.server_port, "rss_after_warmup_mb": _peak_rss_mb(),
+               "startup_timings": main_backend.startup_timings})
+    stop.wait()
+    server.shutdown()
+    results.put({"peak_rss_mb": _peak_rss_mb(), "flashcard_cache": main_backend.flashcard_cache.stats()})
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=600) as response:
+        return json.loads(response.read())
+
+
+def run_load(base_url, texts, concurrency, ocr=False, first_page=0):
+    """
+    Sends one /generate request per text from concurrency client threads. With ocr,
+    text i is requested as stub page first_page + i instead of being passed directly.
+    """
+    latencies, failures = [], []
+    counts = {"flashcards": 0, "unparsed_sections": 0}
+    lock = threading.Lock()
+
+    def one(i):
+        if ocr:
+            url = f"{base_url}/generate/page-{first_page + i}.jpg"
+        else:
+            url = f"{base_url}/generate/bench?" + urllib.parse.urlencode({"text": texts[i]})
+        start = time.perf_counter()
+        try:
+            result = _get(url)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            counts["flashcards"] += len(result["flashcards"])
+            counts["unparsed_sections"] += len(result["failures"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(len(texts))))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    report = {
+        "concurrency": concurrency,
+        "requests": len(texts),
+        "errors": len(failures),
+        "seconds": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        **counts,
+    }
+    if len(latencies_ms):
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        report.update(latency_ms={"mean": float(latencies_ms.mean()), "p50": float(p50), "p95": float(p95),
+                                  "p99": float(p99), "max": float(latencies_ms.max())})
+    if failures:
+        report["first_error"] = failures[0]
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of /generate")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated client counts, one run each")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per run")
+    parser.add_argument("--notes-per-request", type=int, default=3)
+    parser.add_argument("--tokenizer", default=None, help="Tokenizer for the random T5 (default: the app's model)")
+    parser.add_argument("--d-model", type=int, default=128)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--ocr", action="store_true", help="Go through the stubbed OCR instead of ?text=")
+    parser.add_argument("--ocr-seconds", type=float, default=0.0, help="Simulated OCR latency per page")
+    parser.add_argument("--cache", action="store_true", help="Keep the flashcard cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    if not args.cache:
+        os.environ["FLASHCARDS_CACHE_SIZE"] = "0"
+    os.environ.pop("FLASHCARDS_PRELOAD", None)
+    texts = make_request_texts(args.requests * len(levels), args.notes_per_request, args.seed)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        parameters = make_random_t5(args.tokenizer or "finetuned_flan_t5_flashcards_v2", model_dir,
+                                    args.d_model, args.layers, args.seed)
+        ctx = multiprocessing.get_context("spawn")
+        ready, results, stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+        server = ctx.Process(target=_serve, args=(model_dir, texts, args.ocr_seconds, ready, stop, results))
+        server.start()
+        try:
+            startup = ready.get(timeout=600)
+            base_url = f"http://127.0.0.1:{startup['port']}"
+            # Every run gets its own texts, so no run is served from an earlier run's work
+            runs = [run_load(base_url, texts[i * args.requests:(i + 1) * args.requests], level, args.ocr,
+                             first_page=i * args.requests)
+                    for i, level in enumerate(levels)]
+        finally:
+            stop.set()
+        server_stats = results.get(timeout=60)
+        server.join()
+
+    report = {
+        "commit": git_commit(),
+        "settings": {
+            "requests": args.requests, "notes_per_request": args.notes_per_request, "ocr": args.ocr,
+            "ocr_seconds": args.ocr_seconds, "cache": args.cache, "d_model": args.d_model, "layers": args.layers,
+            "model_parameters": parameters,
+            "env": {key: value for key, value in os.environ.items() if key.startswith("FLASHCARDS_")},
+        },
+        "startup_timings": startup["startup_timings"],
+        "rss_after_warmup_mb": startup["rss_after_warmup_mb"],
+        "peak_rss_mb": server_stats["peak_rss_mb"],
+        "flashcard_cache": server_stats["flashcard_cache"],
+        "runs": runs,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
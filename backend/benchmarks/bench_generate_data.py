@@ -0,0 +1,60 @@
+"""
+Notes/sec of generate_data.py's local generation paths on the first notes of a corpus:
+GPT-2 one note at a time (the old loop), batched, and batched with the shared
+FEW_SHOT_PROMPT key/value cache; and FLAN-T5 one at a time vs batched.
+Generation is greedy so every GPT-2 variant does the same amount of work.
+
+Usage: python -m benchmarks.bench_generate_data <gpt2_model> <t5_model> [num_notes] [batch_size]
+"""
+
+import json
+import sys
+import time
+
+import generate_data
+from corpus import iter_records
+
+DATA_PATH = "triviaqa_notes_generated.json"
+GENERATION_KWARGS = dict(max_new_tokens=32, do_sample=False)
+
+
+def notes_per_sec(generate_batch, notes, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(notes), batch_size):
+        generate_batch(notes[i:i + batch_size])
+    return len(notes) / (time.perf_counter() - start)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    gpt2_name, t5_name = sys.argv[1], sys.argv[2]
+    num_notes = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else generate_data.BATCH_SIZE
+    notes = [record["note"] for _, record in zip(range(num_notes), iter_records(DATA_PATH))]
+
+    tokenizer, model = generate_data.load_model(gpt2_name, use_flan_t5=False)
+    uncached = generate_data.GPT2FewShotGenerator(tokenizer, model, use_prefix_cache=False,
+                                                  generation_kwargs=GENERATION_KWARGS)
+    cached = generate_data.GPT2FewShotGenerator(tokenizer, model, use_prefix_cache=True,
+                                                generation_kwargs=GENERATION_KWARGS)
+    gpt2 = {
+        "sequential": notes_per_sec(uncached.generate, notes, 1),
+        "batched": notes_per_sec(uncached.generate, notes, batch_size),
+        "batched_prefix_cache": notes_per_sec(cached.generate, notes, batch_size),
+    }
+
+    tokenizer, model = generate_data.load_model(t5_name, use_flan_t5=True)
+    t5_batch = lambda batch: generate_data.generate_t5_batch(tokenizer, model, batch)
+    t5 = {
+        "sequential": notes_per_sec(t5_batch, notes, 1),
+        "batched": notes_per_sec(t5_batch, notes, batch_size),
+    }
+
+    print(json.dumps({"notes": len(notes), "batch_size": batch_size,
+                      "gpt2_notes_per_s": gpt2, "t5_notes_per_s": t5}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Bytes sent and time per page of the OCR stage against a local stub of the vision API.
+
+The stub speaks the chat completions protocol the openai client uses, and its
+latency grows with the request size (a fixed cost plus upload time at a fixed
+bandwidth), roughly like a real upload. Synthetic phone-photo-sized pages are
+transcribed three ways: raw uploads one at a time (the old behaviour), preprocessed
+uploads one at a time, and preprocessed uploads with concurrent pages. Some pages are
+duplicates, to show requests for the same image in flight together being coalesced.
+
+Usage: python -m benchmarks.bench_ocr [pages] [duplicates] [concurrency]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import openai
+from PIL import Image, ImageDraw
+
+import hand_to_text
+
+STUB_BASE_SECONDS = 0.3
+STUB_BYTES_PER_SECOND = 10 * 1024 * 1024
+
+
+class StubVisionHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(STUB_BASE_SECONDS + len(body) / STUB_BYTES_PER_SECOND)
+        reply = json.dumps({
+            "id": "stub", "object": "chat.completion", "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                "role": "assistant", "content": "Here is the extracted text:\nWater boils at 100 degrees Celsius."}}],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_page(path, seed):
+    rng = np.random.default_rng(seed)
+    height, width = 3024, 4032
+    paper = 225 + 20 * np.linspace(0, 1, width)[None, :, None] + rng.normal(0, 3, (height, width, 3))
+    image = Image.fromarray(np.clip(paper, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        draw.text((200, 150 + line * 70), f"Page {seed} line {line}: the derivative of x squared is 2x", fill=(40, 40, 60))
+    image.save(path, format="JPEG", quality=92)
+
+
+def run(paths, preprocess, concurrency):
+    hand_to_text.OCR_PREPROCESS = preprocess
+    before = hand_to_text.ocr_stats()
+    start = time.perf_counter()
+    pages = hand_to_text.describe_images(paths, max_concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    after = hand_to_text.ocr_stats()
+    assert all(error is None for _, error in pages), pages
+    requests = after["pages"] - before["pages"]
+    return {
+        "pages": len(paths),
+        "requests": requests,
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "original_bytes_per_page": (after["original_bytes"] - before["original_bytes"]) / requests,
+        "sent_bytes_per_page": (after["sent_bytes"] - before["sent_bytes"]) / requests,
+        "preprocess_ms_per_request": 1000 * (after["preprocess_seconds"] - before["preprocess_seconds"]) / requests,
+        "total_s": elapsed,
+        "s_per_page": elapsed / len(paths),
+    }
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    duplicates = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else hand_to_text.OCR_CONCURRENCY
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubVisionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openai.api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    openai.api_key = "stub"
+    hand_to_text.set_vision_client(hand_to_text.openai_vision_client)
+    hand_to_text.ocr_cache = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for page in range(pages - duplicates):
+            paths.append(os.path.join(tmp, f"page{page}.jpg"))
+            make_page(paths[-1], page)
+            if page < duplicates:
+                paths.append(paths[-1])  # A re-uploaded page, sent right after the original
+        # Warm up Pillow and the preprocessing pool outside the timed runs
+        hand_to_text._run_preprocess(open(paths[0], "rb").read())
+
+        report = {
+            "raw_sequential": run(paths, preprocess=False, concurrency=1),
+            "preprocessed_sequential": run(paths, preprocess=True, concurrency=1),
+            "preprocessed_concurrent": run(paths, preprocess=True, concurrency=concurrency),
+        }
+    server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
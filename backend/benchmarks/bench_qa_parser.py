@@ -0,0 +1,125 @@
+"""
+Micro-benchmark of qa_parser.parse against the extraction code it replaced, on model-
+style outputs, followed by a randomized robustness check: random cards are rendered
+with random marker styles, separators and noise (including marker-like words inside
+a field, as in "A: Vitamin A: found in carrots"), and must parse back exactly, and
+random garbage must never raise. A fixed corpus of known hard cases is checked first.
+
+Usage: python -m benchmarks.bench_qa_parser [iterations] [fuzz_cases]
+"""
+
+import json
+import random
+import re
+import string
+import sys
+import timeit
+
+import qa_parser
+
+SAMPLES = [
+    "Q: Who was President when the first Peanuts cartoon was published? A: Harry Truman",
+    "Q: What is the powerhouse of the cell?\nA: The mitochondria.",
+    "Question: At what temperature does water boil?\nAnswer: 100 degrees Celsius.",
+    "Q： Where was Dame Judi Dench born? A： York",
+    "Q1: What is H2O? A1: Water Q2: What is NaCl? A2: Salt",
+    "The mitochondria is the powerhouse of the cell",
+    "Q: What is the capital of France?",
+]
+
+# Outputs that have been misparsed before, with the cards they should give
+CORPUS = [
+    ("Q: Which vitamin is found in carrots? A: Vitamin A: found in carrots",
+     [{"question": "Which vitamin is found in carrots?", "answer": "Vitamin A: found in carrots"}]),
+    ("Q: What does Q: stand for in physics?\nA: Electric charge",
+     [{"question": "What does Q: stand for in physics?", "answer": "Electric charge"}]),
+    ("Q1: What is H2O? A1: Water Q2: What is NaCl? A2: Salt",
+     [{"question": "What is H2O?", "answer": "Water"}, {"question": "What is NaCl?", "answer": "Salt"}]),
+]
+
+_OLD_GENERATE_DATA = re.compile(r"Q[:：]\s*(.*?)\s*A[:：]\s*(.*)", re.IGNORECASE | re.DOTALL)
+
+
+def old_backend(qa):
+    if qa.startswith("Q:") and "A:" in qa:
+        return qa.split("Q:", 1)[1].split("A:", 1)[0].strip(), qa.split("A:", 1)[1].strip()
+    return None
+
+
+def old_generate_data(result):
+    result = result.replace("Answer:", "A:").replace("Question:", "Q:")
+    match = _OLD_GENERATE_DATA.search(result)
+    if match:
+        return match.group(1).strip(), match.group(2).strip()
+    lines = result.split("\n")
+    q_candidates = [line for line in lines if line.strip().endswith("?")]
+    a_candidates = [line for line in lines if not line.strip().endswith("?") and len(line.strip()) > 1]
+    return (q_candidates[0].strip() if q_candidates else None, a_candidates[0].strip() if a_candidates else None)
+
+
+def per_call_us(fn, iterations):
+    seconds = timeit.timeit(lambda: [fn(sample) for sample in SAMPLES], number=iterations)
+    return seconds / (iterations * len(SAMPLES)) * 1e6
+
+
+def _random_words(rng, low, high):
+    alphabet = string.ascii_letters + string.digits + "  ,.'-?"
+    return " ".join("".join(rng.choices(alphabet, k=rng.randint(1, 8))) for _ in range(rng.randint(low, high))).strip()
+
+
+def _clean(text):
+    # Field text must not itself contain something that reads as a marker
+    return re.sub(r"\b(?:Q|A|question|answer)\w*\s*[:：]", "", text, flags=re.IGNORECASE).strip() or "x"
+
+
+def _inner_marker(rng, text, markers):
+    # Sometimes puts a marker of the field's own kind mid-sentence, after a plain word
+    if rng.random() < 0.8:
+        return text
+    word = "".join(rng.choices(string.ascii_letters, k=rng.randint(1, 8)))
+    return f"{word} {rng.choice(markers)}{rng.choice([':', '：'])} {text}"
+
+
+def fuzz(cases, seed=0):
+    rng = random.Random(seed)
+    mismatches = [text for text, cards in CORPUS if qa_parser.parse(text)["cards"] != cards]
+    for case in range(cases):
+        cards = [{"question": _inner_marker(rng, _clean(_random_words(rng, 1, 12)), ["Q", "Question", "Q3"]),
+                  "answer": _inner_marker(rng, _clean(_random_words(rng, 1, 6)), ["A", "Answer", "A3"])}
+                 for _ in range(rng.randint(1, 4))]
+        parts = [_clean(_random_words(rng, 0, 3))] if rng.random() < 0.3 else []
+        for i, card in enumerate(cards, 1):
+            q, a = rng.choice([("Q", "A"), ("Question", "Answer"), (f"Q{i}", f"A{i}"), ("question", "answer")])
+            colon = rng.choice([":", "：", " :"])
+            sep = rng.choice([" ", "\n", "  \n"])
+            parts.append(f"{q}{colon} {card['question']}{sep}{a}{colon} {card['answer']}")
+        text = rng.choice([" ", "\n", "\n\n"]).join(parts)
+        if qa_parser.parse(text)["cards"] != cards:
+            mismatches.append(text)
+
+        garbage = "".join(rng.choices(string.printable + "：", k=rng.randint(0, 80)))
+        result = qa_parser.parse(garbage, fallback=rng.random() < 0.5)
+        assert isinstance(result["cards"], list) and isinstance(result["failures"], list)
+        assert result["cards"] or result["failures"], garbage
+    return mismatches
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    fuzz_cases = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    timings = {
+        "old_backend_split_us": per_call_us(old_backend, iterations),
+        "old_generate_data_us": per_call_us(old_generate_data, iterations),
+        "qa_parser_us": per_call_us(qa_parser.parse, iterations),
+        "qa_parser_fallback_us": per_call_us(lambda text: qa_parser.parse(text, fallback=True), iterations),
+    }
+    mismatches = fuzz(fuzz_cases)
+    print(json.dumps({"per_call": timings, "parsed": [qa_parser.parse(s) for s in SAMPLES[4:]],
+                      "fuzz_cases": fuzz_cases, "fuzz_mismatches": mismatches[:5],
+                      "fuzz_mismatch_count": len(mismatches)}, indent=2, ensure_ascii=False))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
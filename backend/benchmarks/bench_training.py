@@ -0,0 +1,84 @@
+"""
+Training throughput on triviaqa_notes_generated.json with three batching setups:
+  fixed       - every example padded to max_length, batch_size examples per batch (old model.py)
+  dynamic     - batch_size examples per batch, padded to the longest in the batch
+  bucketed    - TokenBudgetBatchSampler batches of similar length under max_tokens
+
+Reports real (non-padding) tokens/sec, padded tokens processed and peak batch size
+in tokens over the first num_examples examples.
+
+Usage: python -m benchmarks.bench_training <model_dir> [num_examples] [batch_size] [max_tokens]
+"""
+
+import json
+import sys
+import time
+
+from torch.optim import AdamW
+from torch.utils.data import DataLoader, Subset
+from transformers import T5ForConditionalGeneration
+
+from flashcard_data import (PretokenizedFlashcardDataset, DynamicPaddingCollator, TokenBudgetBatchSampler,
+                            ensure_pretokenized)
+
+DATA_PATH = "triviaqa_notes_generated.json"
+PREFIX = "triviaqa_notes_generated.tok"
+
+
+def train(model_dir, loader, pad_token_id):
+    model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    model.train()
+    optimizer = AdamW(model.parameters(), lr=5e-5)
+    real_tokens = padded_tokens = peak_tokens = 0
+    start = time.perf_counter()
+    for batch in loader:
+        labels = batch["labels"].clone()
+        labels[labels == pad_token_id] = -100
+        loss = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"], labels=labels).loss
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        real_tokens += int(batch["attention_mask"].sum()) + int((labels != -100).sum())
+        batch_tokens = batch["input_ids"].numel() + labels.numel()
+        padded_tokens += batch_tokens
+        peak_tokens = max(peak_tokens, batch_tokens)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "real_tokens_per_s": real_tokens / elapsed,
+        "padded_tokens": padded_tokens,
+        "padding_fraction": 1 - real_tokens / padded_tokens,
+        "peak_batch_tokens": peak_tokens,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    model_dir = sys.argv[1]
+    num_examples = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    max_tokens = int(sys.argv[4]) if len(sys.argv) > 4 else 1024
+
+    ensure_pretokenized(DATA_PATH, model_dir, PREFIX)
+    indices = list(range(num_examples))
+    padded = Subset(PretokenizedFlashcardDataset(PREFIX), indices)
+    unpadded_full = PretokenizedFlashcardDataset(PREFIX, pad=False)
+    unpadded = Subset(unpadded_full, indices)
+    pad_token_id = unpadded_full.pad_token_id
+    collate = DynamicPaddingCollator(pad_token_id)
+    sampler = TokenBudgetBatchSampler(unpadded_full.lengths()[indices], max_tokens=max_tokens)
+
+    report = {
+        "examples": num_examples,
+        "fixed": train(model_dir, DataLoader(padded, batch_size=batch_size, shuffle=True), pad_token_id),
+        "dynamic": train(model_dir, DataLoader(unpadded, batch_size=batch_size, shuffle=True, collate_fn=collate), pad_token_id),
+        "bucketed": train(model_dir, DataLoader(unpadded, batch_sampler=sampler, collate_fn=collate), pad_token_id),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Memory-per-worker and requests/sec benchmark for serve.py.
+
+Starts the pre-fork server with 1, 2, 4 and 8 workers, replays notes from
+triviaqa_notes_generated.json through /generate?text= with two concurrent clients
+per worker, and reads each worker's RSS and PSS from /proc. PSS splits shared pages
+between the processes mapping them, so it shows what each extra worker really costs.
+The flashcard cache is disabled so every request reaches the model. Linux only.
+
+Usage: python -m benchmarks.bench_workers [requests_per_run] [worker counts ...]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_PATH = "triviaqa_notes_generated.json"
+PORT = 5055
+
+
+def load_notes():
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        return [item["note"] for item in json.load(f)]
+
+
+def get(path, timeout=60):
+    with urllib.request.urlopen(f"http://127.0.0.1:{PORT}{path}", timeout=timeout) as response:
+        return response.status
+
+
+def wait_until_ready(num_workers, timeout=300):
+    # Requests land on whichever worker accepts first, so require a run of ready answers
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        try:
+            streak = streak + 1 if get("/readyz", timeout=5) == 200 else 0
+        except OSError:
+            streak = 0
+        if streak >= num_workers * 4:
+            return
+        time.sleep(0.2)
+    raise TimeoutError("Workers did not become ready")
+
+
+def worker_memory(parent_pid):
+    with open(f"/proc/{parent_pid}/task/{parent_pid}/children") as f:
+        pids = [int(pid) for pid in f.read().split()]
+    usage = []
+    for pid in pids:
+        fields = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+        usage.append({"rss_mb": fields.get("Rss", 0.0), "pss_mb": fields.get("Pss", 0.0)})
+    return usage
+
+
+def run(num_workers, notes, num_requests):
+    env = dict(os.environ, FLASHCARDS_CACHE_SIZE="0")
+    server = subprocess.Popen([sys.executable, "serve.py", "--workers", str(num_workers), "--port", str(PORT)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(num_workers)
+        rng = random.Random(0)
+        paths = ["/generate/bench?" + urllib.parse.urlencode({"text": "- " + "\n- ".join(rng.sample(notes, 3))})
+                 for _ in range(num_requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=num_workers * 2) as pool:
+            list(pool.map(get, paths))
+        elapsed = time.perf_counter() - start
+        memory = worker_memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "workers": num_workers,
+        "requests_per_s": num_requests / elapsed,
+        "rss_mb_per_worker": sum(m["rss_mb"] for m in memory) / len(memory),
+        "pss_mb_per_worker": sum(m["pss_mb"] for m in memory) / len(memory),
+        "pss_mb_total": sum(m["pss_mb"] for m in memory),
+    }
+
+
+def main():
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    worker_counts = [int(n) for n in sys.argv[2:]] or [1, 2, 4, 8]
+    notes = load_notes()
+    print(json.dumps([run(n, notes, num_requests) for n in worker_counts], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Local load generator for the cross-request inference scheduler.
+
+Simulates concurrent /generate requests, each carrying a few note sections drawn
+from triviaqa_notes_generated.json, and compares serving them one request at a time
+(per-request batching behind a lock, like the plain Flask app) against the
+micro-batching scheduler.
+
+Usage: python -m benchmarks.load_scheduler [clients] [requests_per_client] [sections_per_request]
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import main_backend
+from inference_scheduler import InferenceScheduler
+
+DATA_PATH = "triviaqa_notes_generated.json"
+
+
+def make_requests(num_requests, sections_per_request, seed=0):
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        notes = [item["note"] for item in json.load(f)]
+    rng = random.Random(seed)
+    return [rng.sample(notes, sections_per_request) for _ in range(num_requests)]
+
+
+def run_load(handle, requests, clients):
+    latencies = []
+    start = time.perf_counter()
+
+    def one(notes):
+        t0 = time.perf_counter()
+        handle(notes)
+        latencies.append(time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, requests))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_s": len(requests) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+    }
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    sections = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    requests = make_requests(clients * per_client, sections)
+
+    model_lock = threading.Lock()
+
+    def unscheduled(notes):
+        with model_lock:
+            main_backend.generate_flashcards_batch(notes)
+
+    scheduler = InferenceScheduler(main_backend.generate_flashcards_batch,
+                                   max_batch_size=main_backend.MAX_BATCH_SIZE,
+                                   max_wait_ms=main_backend.SCHEDULER_MAX_WAIT_MS).start()
+
+    unscheduled(requests[0])  # Warm-up
+    baseline = run_load(unscheduled, requests, clients)
+    scheduled = run_load(scheduler.submit, requests, clients)
+    scheduler.stop()
+
+    print(f"Clients: {clients}  requests: {len(requests)}  sections/request: {sections}")
+    print(f"Per-request: {baseline['requests_per_s']:.1f} req/s  p50 {baseline['p50_ms']:.0f}ms  p95 {baseline['p95_ms']:.0f}ms")
+    print(f"Scheduler:   {scheduled['requests_per_s']:.1f} req/s  p50 {scheduled['p50_ms']:.0f}ms  p95 {scheduled['p95_ms']:.0f}ms")
+    print("Scheduler stats:", json.dumps(scheduler.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
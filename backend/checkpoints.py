@@ -0,0 +1,93 @@
+import os
+import random
+import re
+import shutil
+import numpy as np
+import torch
+
+STATE_FILE = "training_state.pt"
+
+
+def checkpoint_path(checkpoint_dir, step):
+    return os.path.join(checkpoint_dir, f"checkpoint-{step}")
+
+
+def list_checkpoints(checkpoint_dir):
+    """Returns complete checkpoint directories under checkpoint_dir, oldest first."""
+    if not os.path.isdir(checkpoint_dir):
+        return []
+    found = {}
+    for name in os.listdir(checkpoint_dir):
+        match = re.fullmatch(r"checkpoint-(\d+)(\.old)?", name)
+        path = os.path.join(checkpoint_dir, name)
+        # The state file is written last, so a checkpoint without it was interrupted mid-save
+        if match and os.path.isfile(os.path.join(path, STATE_FILE)):
+            step = int(match.group(1))
+            # A ".old" checkpoint is one save_checkpoint was replacing; it only counts if the new one is missing
+            if match.group(2) is None or step not in found:
+                found[step] = path
+    return [found[step] for step in sorted(found)]
+
+
+def latest_checkpoint(checkpoint_dir):
+    checkpoints = list_checkpoints(checkpoint_dir)
+    return checkpoints[-1] if checkpoints else None
+
+
+def save_checkpoint(checkpoint_dir, model, tokenizer, optimizer, lr_scheduler, state, keep=2):
+    """
+    Saves model weights, tokenizer, optimizer and scheduler state, RNG states and the
+    training progress in state (step, epoch, ...) to checkpoint_dir/checkpoint-<step>,
+    then deletes all but the newest `keep` checkpoints.
+
+    The checkpoint is written to a temporary directory and renamed into place, so a
+    crash mid-save never leaves a half-written checkpoint where the latest one was
+    (an epoch-end save can have the same step as the one before it).
+    """
+    path = checkpoint_path(checkpoint_dir, state["global_step"])
+    tmp_path, old_path = path + ".tmp", path + ".old"
+    # Leftovers of saves that were interrupted
+    if os.path.isdir(checkpoint_dir):
+        for name in os.listdir(checkpoint_dir):
+            if re.fullmatch(r"checkpoint-\d+\.tmp", name):
+                shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+    os.makedirs(tmp_path)
+    model.save_pretrained(tmp_path)
+    tokenizer.save_pretrained(tmp_path)
+    torch.save({
+        "optimizer": optimizer.state_dict(),
+        "lr_scheduler": lr_scheduler.state_dict(),
+        "rng": {
+            "python": random.getstate(),
+            "numpy": np.random.get_state(),
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        },
+        "state": state,
+    }, os.path.join(tmp_path, STATE_FILE))
+
+    # A directory can't be replaced while it has files in it, so move the previous one aside first
+    if os.path.isdir(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    if keep:
+        for old in list_checkpoints(checkpoint_dir)[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def load_training_state(path, optimizer, lr_scheduler):
+    """Restores optimizer, scheduler and RNG states from a checkpoint and returns its training progress."""
+    saved = torch.load(os.path.join(path, STATE_FILE), map_location="cpu", weights_only=False)
+    optimizer.load_state_dict(saved["optimizer"])
+    lr_scheduler.load_state_dict(saved["lr_scheduler"])
+    rng = saved["rng"]
+    random.setstate(rng["python"])
+    np.random.set_state(rng["numpy"])
+    torch.set_rng_state(rng["torch"])
+    if rng["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng["cuda"])
+    return saved["state"]
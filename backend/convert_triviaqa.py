@@ -1,71 +1,251 @@
-from datasets import load_dataset
-import openai  # Only needed if using GPT-4 or GPT-3.5
+import argparse
 import json
-import time
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import openai  # Only needed if using GPT-4 or GPT-3.5
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
+# openai also reads OPENAI_API_BASE, so pointing it at a local OpenAI-compatible server needs no code change
 
 NUM_SAMPLES = 1500  # How many QAs to use
 BATCH_SIZE = 25     # Number of QAs per request
 OUTPUT_FILE = "triviaqa_notes_generated.json"
+PROGRESS_FILE = "triviaqa_notes_generated.jsonl"  # Append-only, one converted note per line
+CONCURRENCY = 4          # Requests in flight at once
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 60000
+MAX_RETRIES = 5
+MAX_TOKENS = 500
+
+
+class TokenBucket:
+    """Blocks callers so that on average no more than rate units per second are taken."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_for = (amount - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def openai_chat_client(prompt):
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        max_tokens=MAX_TOKENS
+    )
+    return response.choices[0].message["content"].strip()
+
+
+def fake_chat_client(prompt, latency=0.2):
+    # Offline stand-in that answers every Qn with a templated note, for testing the pipeline
+    time.sleep(latency)
+    lines = []
+    for line in prompt.splitlines():
+        if line.startswith("A") and ":" in line:
+            label, answer = line.split(":", 1)
+            if label[1:].isdigit():
+                lines.append(f"N{label[1:]}: The answer is {answer.strip()}.")
+    return "\n".join(lines)
+
+
+def build_prompt(batch):
+    prompt = "You are a helpful student taking notes from a teacher.\n\nHere are some Q&As. Write one realistic class note for each, labeled N1, N2, etc.:\n\n"
+    for i, (q, a) in enumerate(batch, 1):
+        prompt += f"Q{i}: {q}\nA{i}: {a}\n"
+    prompt += "\nReturn one sentence note per Q&A as N1, N2, etc."
+    return prompt
+
+
+def parse_notes(note_text, batch):
+    converted = []
+    for i, (q, a) in enumerate(batch, 1):
+        label = f"N{i}:"
+        note_line = next((line for line in note_text.splitlines() if line.startswith(label)), None)
+        if note_line:
+            converted.append({"note": note_line[len(label):].strip(), "question": q, "answer": a})
+    return converted
+
+
+def load_qa_batches(batch_size, start_offset=0, done_pairs=()):
+    """
+    Returns (first, end, batch) for batches of batch_size Q&As, where first and end
+    are the absolute dataset offsets of the pairs the batch covers. Pairs before
+    start_offset and in done_pairs are left out, so batches can be rebuilt with a
+    different size or offset on resume without repeating or skipping pairs.
+    """
+    from datasets import load_dataset
+
+    # Load TriviaQA
+    dataset = load_dataset("trivia_qa", "unfiltered.nocontext", split="train[:2000]")
+    pairs = []
+    for item in dataset:
+        question = item.get("question", "").strip()
+        answer = item.get("answer", {}).get("value", "").strip()
+        if question and answer:
+            pairs.append((question, answer))
+    return make_batches(pairs, batch_size, start_offset, done_pairs)
+
+
+def make_batches(pairs, batch_size, start_offset=0, done_pairs=()):
+    done_pairs = set(done_pairs)
+    remaining = [offset for offset in range(start_offset, len(pairs)) if offset not in done_pairs]
+    batches = []
+    for i in range(0, len(remaining) - batch_size + 1, batch_size):
+        offsets = remaining[i:i + batch_size]
+        batches.append((offsets[0], offsets[-1] + 1, [pairs[offset] for offset in offsets]))
+    return batches
+
+
+def read_progress(path):
+    """
+    Returns the records already written to the progress file and the absolute offsets
+    of every pair their batches covered (including pairs whose note didn't parse).
+    """
+    records = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # Partially written last line from a crash
+    done_pairs = set()
+    for record in records:
+        done_pairs.update(range(record["batch"], record["batch_end"]))
+    return records, done_pairs
+
+
+class ConversionPipeline:
+    """
+    Converts batches of Q&As into notes with concurrent, rate-limited, retried LLM calls.
+
+    Every converted note is appended to progress_path as soon as its batch finishes,
+    tagged with the dataset offsets its batch covered ("batch" to "batch_end"), so a
+    restarted run can leave out pairs that are already done.
+    client(prompt) -> str is injectable, e.g. fake_chat_client for offline runs.
+    """
+
+    def __init__(self, client, progress_path, concurrency=CONCURRENCY, requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_retries=MAX_RETRIES):
+        self.client = client
+        self.progress_path = progress_path
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1, concurrency))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_retries = max_retries
+        self.write_lock = threading.Lock()
+
+    def call_with_retries(self, prompt):
+        estimated_tokens = len(prompt) // 4 + MAX_TOKENS
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire()
+            self.token_bucket.acquire(estimated_tokens)
+            try:
+                return self.client(prompt)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt) * (0.5 + random.random())
+                print(f"⚠️ {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def convert_batch(self, first, end, batch):
+        note_text = self.call_with_retries(build_prompt(batch))
+        records = [dict(record, batch=first, batch_end=end) for record in parse_notes(note_text, batch)]
+        with self.write_lock:
+            with open(self.progress_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return records
+
+    def run(self, batches, num_samples):
+        """Converts batches from load_qa_batches, which should leave out the pairs read_progress reports done."""
+        records, done_pairs = read_progress(self.progress_path)
+        total = len(records)
+        if records:
+            print(f"⏩ Resuming: {total} notes from {len(done_pairs)} Q&As already in {self.progress_path}")
+        pending = [batch for batch in batches if not done_pairs.issuperset(range(batch[0], batch[1]))]
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while (pending or in_flight) and total < num_samples:
+                # Keep the pool busy, but don't queue far beyond what the sample target needs
+                while pending and len(in_flight) < self.concurrency * 2:
+                    in_flight.add(pool.submit(self.convert_batch, *pending.pop(0)))
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        total += len(future.result())
+                        print(f"✅ {total} / {num_samples}")
+                    except Exception as e:
+                        print(f" Failed on batch: {e}")
+            for future in in_flight:
+                future.cancel()
+        return total
+
+
+def write_json_output(progress_path, output_path, num_samples):
+    records, _ = read_progress(progress_path)
+    records.sort(key=lambda record: record["batch"])
+    converted = [{k: v for k, v in record.items() if k not in ("batch", "batch_end")}
+                 for record in records[:num_samples]]
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(converted, f, indent=2, ensure_ascii=False)
+    return len(converted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate class notes from TriviaQA Q&As with an LLM")
+    parser.add_argument("--num-samples", type=int, default=NUM_SAMPLES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--requests-per-minute", type=float, default=REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=float, default=TOKENS_PER_MINUTE)
+    parser.add_argument("--start-offset", type=int, default=0, help="Skip this many Q&As at the start of the dataset")
+    parser.add_argument("--progress", default=PROGRESS_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake client instead of OpenAI")
+    args = parser.parse_args()
+
+    client = fake_chat_client if args.fake else openai_chat_client
+    _, done_pairs = read_progress(args.progress)
+    batches = load_qa_batches(args.batch_size, args.start_offset, done_pairs)
+
+    print(" Generating notes from Q&A in batches...")
+    pipeline = ConversionPipeline(client, args.progress, concurrency=args.concurrency,
+                                  requests_per_minute=args.requests_per_minute,
+                                  tokens_per_minute=args.tokens_per_minute)
+    pipeline.run(batches, args.num_samples)
+
+    # Save to file
+    print(f"💾 Saving to {args.output}...")
+    saved = write_json_output(args.progress, args.output, args.num_samples)
+    print(f" Done. {saved} notes saved.")
+
 
-# Load TriviaQA
-dataset = load_dataset("trivia_qa", "unfiltered.nocontext", split="train[:2000]")
-
-converted = []
-
-print(" Generating notes from Q&A in batches...")
-
-batch = []
-for item in dataset:
-    question = item.get("question", "").strip()
-    answer = item.get("answer", {}).get("value", "").strip()
-
-    if not question or not answer:
-        continue
-
-    batch.append((question, answer))
-
-    if len(batch) == BATCH_SIZE:
-        # Construct prompt with batched QAs
-        prompt = "You are a helpful student taking notes from a teacher.\n\nHere are some Q&As. Write one realistic class note for each, labeled N1, N2, etc.:\n\n"
-        for i, (q, a) in enumerate(batch, 1):
-            prompt += f"Q{i}: {q}\nA{i}: {a}\n"
-        prompt += "\nReturn one sentence note per Q&A as N1, N2, etc."
-
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=500
-            )
-            note_text = response.choices[0].message["content"].strip()
-
-            # Extract each note
-            for i, (q, a) in enumerate(batch, 1):
-                label = f"N{i}:"
-                note_line = next((line for line in note_text.splitlines() if line.startswith(label)), None)
-                if note_line:
-                    note = note_line[len(label):].strip()
-                    converted.append({
-                        "note": note,
-                        "question": q,
-                        "answer": a
-                    })
-                    print(f"✅ {len(converted)} / {NUM_SAMPLES}: {note}")
-        except Exception as e:
-            print(f" Failed on batch {len(converted)}: {e}")
-
-        batch = []
-
-    if len(converted) >= NUM_SAMPLES:
-        break
-
-# Save to file
-print(f"💾 Saving to {OUTPUT_FILE}...")
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(converted, f, indent=2, ensure_ascii=False)
-
-print(" Done.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import glob
+import json
+import os
+import re
+
+# Corpora come in two schemas:
+#   "qa":     {"note": ..., "question": ..., "answer": ...}   (triviaqa_notes_generated.json)
+#   "target": {"note": ..., "target": "Q: ...\nA: ..."}       (note_qa_pairs.json, simulated_notes_dataset.json)
+# Readers normalize everything to "qa"; writers can emit either.
+SCHEMAS = ("qa", "target")
+
+_TARGET_PATTERN = re.compile(r"^\s*Q:\s*(.*?)\s*\nA:\s*(.*?)\s*$", re.DOTALL)
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def normalize_record(item):
+    """Returns item in the "qa" schema, parsing "target" if that's all it has."""
+    if "question" in item and "answer" in item:
+        return {"note": item["note"], "question": item["question"], "answer": item["answer"]}
+    match = _TARGET_PATTERN.match(item.get("target") or "")
+    if not match:
+        raise ValueError(f"Record has neither question/answer nor a Q:/A: target: {item!r}")
+    return {"note": item["note"], "question": match.group(1), "answer": match.group(2)}
+
+
+def to_schema(record, schema):
+    if schema == "qa":
+        return record
+    if schema == "target":
+        return {"note": record["note"], "target": f"Q: {record['question']}\nA: {record['answer']}"}
+    raise ValueError(f"Unknown schema {schema!r}, expected one of {SCHEMAS}")
+
+
+def shard_paths(path):
+    """Expands a file, a directory of .json/.jsonl shards, or a glob pattern into a sorted list of files."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.json")))
+    if any(ch in path for ch in "*?["):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    # Decodes the elements of a top-level JSON array one at a time, so only one chunk
+    # and one element are held in memory rather than the whole parsed file
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+    started = eof = False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if not started and pos < len(buffer):
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            pos = _SEPARATORS.match(buffer, pos + 1).end()
+            started = True
+        if buffer.startswith("]", pos):
+            return
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # An element ending exactly at the buffer's end might be a number cut short
+                if end < len(buffer) or eof:
+                    yield item
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        if eof:
+            raise ValueError("Unterminated JSON array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def iter_raw_records(path):
+    """Yields the records of a corpus as stored, streaming both JSONL and JSON-array files."""
+    for file_path in shard_paths(path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            if file_path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from _iter_json_array(f)
+
+
+def iter_records(path, num_shards=1, shard_index=0):
+    """
+    Yields the records of a corpus in the "qa" schema without loading it all.
+    With num_shards > 1 only every num_shards-th record (starting at shard_index) is
+    yielded, so several processes can split one corpus between them.
+    """
+    for i, item in enumerate(iter_raw_records(path)):
+        if i % num_shards == shard_index:
+            yield normalize_record(item)
+
+
+def read_records(path):
+    return list(iter_records(path))
+
+
+class CorpusWriter:
+    """
+    Appends records to JSONL. If shard_size is set, path is treated as a prefix and
+    records go to path-00000.jsonl, path-00001.jsonl, ... with shard_size records each.
+    """
+
+    def __init__(self, path, schema="qa", shard_size=None):
+        if schema not in SCHEMAS:
+            raise ValueError(f"Unknown schema {schema!r}, expected one of {SCHEMAS}")
+        self.path = path
+        self.schema = schema
+        self.shard_size = shard_size
+        self.count = 0
+        self.paths = []
+        self._file = None
+
+    def _open_next(self):
+        if self._file:
+            self._file.close()
+        if self.shard_size:
+            prefix = self.path[:-len(".jsonl")] if self.path.endswith(".jsonl") else self.path
+            path = f"{prefix}-{len(self.paths):05d}.jsonl"
+        else:
+            path = self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self.paths.append(path)
+
+    def write(self, record):
+        if self._file is None or (self.shard_size and self.count % self.shard_size == 0):
+            self._open_next()
+        self._file.write(json.dumps(to_schema(normalize_record(record), self.schema), ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_records(records, path, schema="qa", shard_size=None):
+    with CorpusWriter(path, schema, shard_size) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.paths
+
+
+def convert(src, dst, schema="qa", shard_size=None):
+    """Rewrites any corpus (JSON array, JSONL, or shards of either) as JSONL in the given schema."""
+    return write_records(iter_raw_records(src), dst, schema, shard_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert flashcard corpora to streaming JSONL")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert_parser = sub.add_parser("convert", help="Convert a corpus to JSONL")
+    convert_parser.add_argument("src", help="JSON array, JSONL, directory of shards or glob")
+    convert_parser.add_argument("dst", help="Output .jsonl file (or prefix with --shard-size)")
+    convert_parser.add_argument("--schema", choices=SCHEMAS, default="qa")
+    convert_parser.add_argument("--shard-size", type=int, default=None)
+    count_parser = sub.add_parser("count", help="Count the records in a corpus")
+    count_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        paths = convert(args.src, args.dst, args.schema, args.shard_size)
+        print(f"✅ Wrote {len(paths)} file(s): {', '.join(paths)}")
+    else:
+        print(sum(1 for _ in iter_raw_records(args.path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import itertools
+import json
+import re
+import time
+import zlib
+import numpy as np
+from corpus import CorpusWriter, SCHEMAS, iter_records
+
+# MinHash uses h(x) = (a * x + b) mod P over 32-bit shingle hashes; with a < 2^31 the
+# product fits in uint64, so a whole block of signatures is computed without overflow
+_PRIME = np.uint64(4294967291)  # Largest prime below 2^32
+_WORD = re.compile(r"\w+")
+
+
+def record_text(record, fields):
+    return " ".join(str(record[field]) for field in fields)
+
+
+def shingle_hashes(text, size=3):
+    """32-bit hashes of the word size-grams of text (the whole text if it's shorter)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+
+class MinHasher:
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, hash_sets):
+        """MinHash signatures, shape (len(hash_sets), num_perm), for a block of shingle hash sets."""
+        lengths = np.fromiter((len(hashes) for hashes in hash_sets), dtype=np.int64, count=len(hash_sets))
+        flat = np.fromiter(itertools.chain.from_iterable(hash_sets), dtype=np.uint64, count=int(lengths.sum()))
+        starts = np.zeros(len(hash_sets), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        permuted = (flat[:, None] * self.a + self.b) % _PRIME
+        return np.minimum.reduceat(permuted, starts, axis=0).astype(np.uint32)
+
+
+def choose_bands(num_perm, threshold):
+    """The (bands, rows) split of num_perm whose LSH S-curve midpoint (1/b)^(1/r) is closest to threshold."""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            # The lower index becomes the root, so a cluster is represented by its first record
+            self.parent[max(x, y)] = min(x, y)
+
+
+class DedupIndex:
+    """
+    MinHash/LSH index over corpus records.
+
+    Records are added in blocks; each gets a num_perm MinHash signature over word
+    3-grams of the chosen fields. find_clusters() buckets signatures by LSH band, and
+    for every bucket compares members against the bucket's first record, joining those
+    whose estimated Jaccard similarity is at least threshold. Work grows with the
+    number of records and bucket sizes, not with the number of pairs.
+    """
+
+    def __init__(self, fields=("note", "question", "answer"), threshold=0.8, num_perm=128, seed=1):
+        self.fields = fields
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, seed)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.blocks = []
+        self.timings = {"signatures": 0.0, "lsh": 0.0}
+
+    def add(self, records):
+        start = time.perf_counter()
+        self.blocks.append(self.hasher.signatures([shingle_hashes(record_text(r, self.fields)) for r in records]))
+        self.timings["signatures"] += time.perf_counter() - start
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    def find_clusters(self):
+        """Returns the root (first record) of every record's duplicate cluster."""
+        start = time.perf_counter()
+        signatures = np.concatenate(self.blocks) if self.blocks else np.zeros((0, self.hasher.num_perm), np.uint32)
+        clusters = _UnionFind(len(signatures))
+        for band in range(self.bands):
+            band_rows = np.ascontiguousarray(signatures[:, band * self.rows:(band + 1) * self.rows])
+            keys = band_rows.view(np.dtype((np.void, band_rows.dtype.itemsize * self.rows))).ravel()
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+            ends = np.append(starts[1:], len(keys))
+            # Most buckets hold a single record; only visit the ones that collide
+            shared = ends - starts > 1
+            for bucket_start, bucket_end in zip(starts[shared], ends[shared]):
+                bucket = order[bucket_start:bucket_end]
+                first = bucket[0]
+                similarity = (signatures[bucket[1:]] == signatures[first]).mean(axis=1)
+                for member in bucket[1:][similarity >= self.threshold]:
+                    clusters.union(first, member)
+        roots = np.fromiter((clusters.find(i) for i in range(len(signatures))), dtype=np.int64, count=len(signatures))
+        self.timings["lsh"] += time.perf_counter() - start
+        return roots
+
+
+def duplicate_clusters(roots):
+    """Maps each cluster root to its member indices, for clusters with more than one record."""
+    duplicated = np.flatnonzero(roots != np.arange(len(roots)))
+    clusters = {}
+    for i in duplicated.tolist():
+        clusters.setdefault(int(roots[i]), [int(roots[i])]).append(i)
+    return clusters
+
+
+def _blocks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        block = list(itertools.islice(iterator, size))
+        if not block:
+            return
+        yield block
+
+
+def dedup(paths, output_path=None, report_path=None, schema="qa", fields=("note", "question", "answer"),
+          threshold=0.8, num_perm=128, block_size=2000, examples=5):
+    """
+    Finds near-duplicate records across the corpora in paths and, if output_path is
+    given, writes the first record of every cluster (and every unique record) there.
+    Corpora are streamed twice, so nothing but the signatures is kept in memory.
+    """
+    index = DedupIndex(fields, threshold, num_perm)
+    for block in _blocks(itertools.chain.from_iterable(iter_records(path) for path in paths), block_size):
+        index.add(block)
+    roots = index.find_clusters()
+    clusters = duplicate_clusters(roots)
+
+    summary = {
+        "records": len(roots),
+        "unique": int((roots == np.arange(len(roots))).sum()),
+        "duplicate_clusters": len(clusters),
+        "largest_cluster": max((len(m) for m in clusters.values()), default=1),
+        "bands": index.bands,
+        "rows": index.rows,
+        "timings": index.timings,
+    }
+    summary["removed"] = summary["records"] - summary["unique"]
+
+    wanted = {}
+    if report_path:
+        # Keep the text of a few members of the largest clusters, so the report is readable
+        largest = sorted(clusters.items(), key=lambda item: -len(item[1]))
+        for _, members in largest[:100]:
+            for member in members[:examples]:
+                wanted[member] = None
+
+    writer = CorpusWriter(output_path, schema) if output_path else None
+    if writer or wanted:
+        records = itertools.chain.from_iterable(iter_records(path) for path in paths)
+        for i, record in enumerate(records):
+            if writer and roots[i] == i:
+                writer.write(record)
+            if i in wanted:
+                wanted[i] = record
+        if writer:
+            writer.close()
+
+    if report_path:
+        report = dict(summary, clusters=[
+            {"size": len(members), "members": members,
+             "examples": [wanted[m] for m in members[:examples] if wanted.get(m)]}
+            for _, members in sorted(clusters.items(), key=lambda item: -len(item[1]))
+        ])
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and remove near-duplicate flashcard training records")
+    parser.add_argument("paths", nargs="+", help="Corpora to deduplicate together (JSON, JSONL, shard dirs)")
+    parser.add_argument("--output", help="Write the deduplicated corpus to this JSONL file")
+    parser.add_argument("--report", help="Write duplicate clusters to this JSON file")
+    parser.add_argument("--schema", choices=SCHEMAS, default="qa")
+    parser.add_argument("--fields", default="note,question,answer",
+                        help="Comma-separated fields compared; e.g. question,answer to merge templated notes")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Estimated Jaccard similarity to merge")
+    parser.add_argument("--num-perm", type=int, default=128)
+    args = parser.parse_args()
+
+    summary = dedup(args.paths, args.output, args.report, args.schema, tuple(args.fields.split(",")),
+                    args.threshold, args.num_perm)
+    print(json.dumps(summary, indent=2))
+    print(f"✅ {summary['removed']} of {summary['records']} records are near-duplicates")
+
+
+if __name__ == "__main__":
+    main()
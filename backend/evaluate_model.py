@@ -0,0 +1,141 @@
+import argparse
+import json
+import random
+import re
+import time
+import torch
+import evaluate
+from transformers import T5Tokenizer, T5ForConditionalGeneration
+from flashcard_data import format_target
+from corpus import read_records
+import qa_parser
+
+_metrics = {}
+
+
+def get_metric(name="sacrebleu"):
+    # evaluate.load reads the metric script from disk (or the Hub) every time, so load it once
+    if name not in _metrics:
+        _metrics[name] = evaluate.load(name)
+    return _metrics[name]
+
+
+def extract_qa(text):
+    """Returns the (question, answer) of the first card in text, or None for a missing field."""
+    return qa_parser.first_qa(text)
+
+
+def _normalize(text):
+    return re.sub(r"[\s.!?]+$", "", re.sub(r"\s+", " ", (text or "").lower())).strip()
+
+
+def exact_match(predictions, references):
+    """Fraction of predictions whose question, answer, and both match the reference after normalization."""
+    counts = {"question": 0, "answer": 0, "both": 0}
+    for pred, ref in zip(predictions, references):
+        pred_q, pred_a = extract_qa(pred)
+        ref_q, ref_a = extract_qa(ref)
+        q_ok = pred_q is not None and _normalize(pred_q) == _normalize(ref_q)
+        a_ok = pred_a is not None and _normalize(pred_a) == _normalize(ref_a)
+        counts["question"] += q_ok
+        counts["answer"] += a_ok
+        counts["both"] += q_ok and a_ok
+    total = max(len(predictions), 1)
+    return {f"exact_match_{key}": value / total for key, value in counts.items()}
+
+
+def generate_predictions(model, tokenizer, note_ids, device, batch_size=32, max_length=64, timings=None):
+    """
+    Generates a prediction for every tokenized note. Notes are sorted by length so each
+    batch pads as little as possible, and predictions come back in the original order.
+    """
+    timings = timings if timings is not None else {}
+    order = sorted(range(len(note_ids)), key=lambda i: len(note_ids[i]))
+    predictions = [None] * len(note_ids)
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoding = tokenizer.pad({"input_ids": [list(note_ids[i]) for i in batch]}, return_tensors="pt")
+
+            t0 = time.perf_counter()
+            outputs = model.generate(input_ids=encoding["input_ids"].to(device),
+                                     attention_mask=encoding["attention_mask"].to(device),
+                                     max_length=max_length)
+            t1 = time.perf_counter()
+            decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            t2 = time.perf_counter()
+
+            timings["generate"] = timings.get("generate", 0.0) + t1 - t0
+            timings["decode"] = timings.get("decode", 0.0) + t2 - t1
+            for i, text in zip(batch, decoded):
+                predictions[i] = text.strip()
+    return predictions
+
+
+def evaluate_examples(model, tokenizer, note_ids, references, device, batch_size=32, max_length=64,
+                      subsample=None, seed=0):
+    """
+    Scores the model on tokenized notes against reference "Q: ...\\nA: ..." strings.
+    If subsample is set, only that many randomly chosen (but fixed for a given seed)
+    examples are evaluated. Returns BLEU, exact-match scores and per-phase timings.
+    """
+    if subsample is not None and subsample < len(note_ids):
+        keep = sorted(random.Random(seed).sample(range(len(note_ids)), subsample))
+        note_ids = [note_ids[i] for i in keep]
+        references = [references[i] for i in keep]
+
+    timings = {}
+    predictions = generate_predictions(model, tokenizer, note_ids, device, batch_size, max_length, timings)
+
+    t0 = time.perf_counter()
+    results = {"bleu": get_metric("sacrebleu").compute(predictions=predictions,
+                                                       references=[[r] for r in references])["score"]}
+    results.update(exact_match(predictions, references))
+    timings["metrics"] = time.perf_counter() - t0
+    results["examples"] = len(predictions)
+    results["timings"] = timings
+    return results
+
+
+def evaluate_dataset(model, tokenizer, dataset, device, **kwargs):
+    """Evaluates on a PretokenizedFlashcardDataset (or a Subset of one)."""
+    base = getattr(dataset, "dataset", dataset)
+    indices = getattr(dataset, "indices", range(len(dataset)))
+    t0 = time.perf_counter()
+    note_ids = [base.note_ids(i).tolist() for i in indices]
+    references = tokenizer.batch_decode([base.target_ids(i).tolist() for i in indices], skip_special_tokens=True)
+    prepare = time.perf_counter() - t0
+    results = evaluate_examples(model, tokenizer, note_ids, references, device, **kwargs)
+    results["timings"]["prepare"] = prepare
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a saved flashcard model checkpoint")
+    parser.add_argument("checkpoint", help="Directory written by save_pretrained")
+    parser.add_argument("--data", default="triviaqa_notes_generated.json")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-length", type=int, default=64)
+    parser.add_argument("--subsample", type=int, default=None, help="Evaluate a fixed random subset of this size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    t0 = time.perf_counter()
+    tokenizer = T5Tokenizer.from_pretrained(args.checkpoint)
+    model = T5ForConditionalGeneration.from_pretrained(args.checkpoint).to(device)
+    load = time.perf_counter() - t0
+
+    data = read_records(args.data)
+    note_ids = tokenizer([item["note"] for item in data], truncation=True, max_length=256)["input_ids"]
+    references = [format_target(item) for item in data]
+
+    results = evaluate_examples(model, tokenizer, note_ids, references, device, batch_size=args.batch_size,
+                                max_length=args.max_length, subsample=args.subsample, seed=args.seed)
+    results["timings"]["load"] = load
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import json
+import os
+import sys
+from transformers import T5Tokenizer
+from optimum.onnxruntime import ORTModelForSeq2SeqLM
+from inference_backends import ONNX_SOURCE_FILE, onnx_dir_for, weights_fingerprint
+
+
+def export(model_dir, output_dir):
+    """
+    Exports the fine-tuned T5 to ONNX as an encoder, a decoder and a decoder-with-past,
+    so ONNX Runtime can reuse the attention KV cache between decoding steps. The
+    weights' fingerprint is saved alongside, so a stale export is never loaded.
+    """
+    fingerprint = weights_fingerprint(model_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True, use_cache=True)
+    model.save_pretrained(output_dir)
+    T5Tokenizer.from_pretrained(model_dir).save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_SOURCE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"model_dir": model_dir, "fingerprint": fingerprint}, f)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python export_onnx.py <model_dir> [output_dir]")
+        sys.exit(1)
+
+    model_dir = sys.argv[1]
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else onnx_dir_for(model_dir)
+    print(f"Exporting {model_dir} to ONNX...")
+    export(model_dir, output_dir)
+    print(f"✅ ONNX model saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
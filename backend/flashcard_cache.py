@@ -0,0 +1,85 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalize_note(text):
+    # Edits that only change whitespace shouldn't force a regeneration
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class FlashcardCache:
+    """
+    In-process LRU of generated flashcard text keyed by note section.
+
+    Keys combine the normalized note text, the model directory and the generation
+    parameters. When disk_path is given, entries are also written to a SQLite
+    database and looked up there on an in-memory miss, so they survive restarts.
+    """
+
+    def __init__(self, max_entries=4096, disk_path=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS flashcards (key TEXT PRIMARY KEY, output TEXT)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(note, model_dir, params):
+        payload = json.dumps([normalize_note(note), model_dir, params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT output FROM flashcards WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._store(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, output):
+        with self._lock:
+            self._store(key, output)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO flashcards (key, output) VALUES (?, ?)", (key, output))
+                self._db.commit()
+
+    def _store(self, key, output):
+        self._entries[key] = output
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM flashcards")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
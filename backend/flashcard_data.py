@@ -0,0 +1,286 @@
+import itertools
+import json
+import os
+import random
+import sys
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler
+from transformers import T5Tokenizer
+from corpus import iter_records, read_records, shard_paths
+
+
+def format_target(item):
+    return f"Q: {item['question']}\nA: {item['answer']}"
+
+
+# FlashcardDataset Class
+class FlashcardDataset(Dataset):
+    def __init__(self, data_path, tokenizer_name, max_length=256):
+        self.data = read_records(data_path)
+        self.tokenizer = T5Tokenizer.from_pretrained(tokenizer_name)
+        self.max_length = max_length
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        item = self.data[idx]
+        note = item['note']
+        qa = format_target(item)
+        encoding = self.tokenizer(note, padding="max_length", truncation=True, max_length=self.max_length, return_tensors="pt")
+        target = self.tokenizer(qa, padding="max_length", truncation=True, max_length=self.max_length, return_tensors="pt")
+        return {
+            'input_ids': encoding['input_ids'].squeeze(),
+            'attention_mask': encoding['attention_mask'].squeeze(),
+            'labels': target['input_ids'].squeeze()
+        }
+
+
+def _write_ragged(path_prefix, sequences, dtype):
+    lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    tokens = np.empty(offsets[-1], dtype=dtype)
+    for seq, start, end in zip(sequences, offsets[:-1], offsets[1:]):
+        tokens[start:end] = seq
+    np.save(path_prefix + ".tokens.npy", tokens)
+    np.save(path_prefix + ".offsets.npy", offsets)
+
+
+def pretokenize(data_path, tokenizer_name, output_prefix, max_length=256, chunk_size=10000):
+    """
+    Tokenizes every note and "Q: ...\\nA: ..." target once and writes them as flat
+    token-id arrays plus offsets (output_prefix.notes.* and output_prefix.targets.*),
+    with a small JSON file recording how they were built. The corpus is streamed in
+    chunks, so only the (compact) token ids are ever held in memory, not the text.
+    """
+    tokenizer = T5Tokenizer.from_pretrained(tokenizer_name)
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.int32
+
+    notes, targets = [], []
+    records = iter_records(data_path)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        for ids in tokenizer([item['note'] for item in chunk], truncation=True, max_length=max_length)["input_ids"]:
+            notes.append(np.asarray(ids, dtype=dtype))
+        for ids in tokenizer([format_target(item) for item in chunk], truncation=True, max_length=max_length)["input_ids"]:
+            targets.append(np.asarray(ids, dtype=dtype))
+    _write_ragged(output_prefix + ".notes", notes, dtype)
+    _write_ragged(output_prefix + ".targets", targets, dtype)
+
+    with open(output_prefix + ".meta.json", "w", encoding="utf-8") as f:
+        json.dump(_build_meta(data_path, tokenizer_name, max_length, tokenizer.pad_token_id), f, indent=2)
+
+
+def _build_meta(data_path, tokenizer_name, max_length, pad_token_id):
+    sources = []
+    for path in shard_paths(data_path):
+        stat = os.stat(path)
+        sources.append({"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime})
+    return {
+        "sources": sources,
+        "tokenizer": tokenizer_name,
+        "max_length": max_length,
+        "pad_token_id": pad_token_id,
+    }
+
+
+def ensure_pretokenized(data_path, tokenizer_name, output_prefix, max_length=256):
+    """Runs pretokenize unless output_prefix already holds an up-to-date copy of data_path."""
+    try:
+        with open(output_prefix + ".meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        expected = _build_meta(data_path, tokenizer_name, max_length, meta["pad_token_id"])
+        if meta == expected:
+            return output_prefix
+    except (OSError, ValueError, KeyError):
+        pass
+    pretokenize(data_path, tokenizer_name, output_prefix, max_length)
+    return output_prefix
+
+
+class PretokenizedFlashcardDataset(Dataset):
+    """
+    Reads token ids written by pretokenize() through memory-mapped arrays, so items
+    are sliced out of the page cache instead of re-running the tokenizer, and
+    DataLoader worker processes share the same mapping.
+
+    Items are padded to max_length like FlashcardDataset's, unless pad=False, in which
+    case they keep their own length and should be batched with DynamicPaddingCollator.
+    """
+
+    def __init__(self, prefix, pad=True):
+        self.pad = pad
+        with open(prefix + ".meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.max_length = meta["max_length"]
+        self.pad_token_id = meta["pad_token_id"]
+        self.note_tokens = np.load(prefix + ".notes.tokens.npy", mmap_mode="r")
+        self.note_offsets = np.load(prefix + ".notes.offsets.npy", mmap_mode="r")
+        self.target_tokens = np.load(prefix + ".targets.tokens.npy", mmap_mode="r")
+        self.target_offsets = np.load(prefix + ".targets.offsets.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.note_offsets) - 1
+
+    def note_ids(self, idx):
+        return self.note_tokens[self.note_offsets[idx]:self.note_offsets[idx + 1]]
+
+    def target_ids(self, idx):
+        return self.target_tokens[self.target_offsets[idx]:self.target_offsets[idx + 1]]
+
+    def lengths(self):
+        """(note length, target length) of every example, shape (N, 2), used for bucketing."""
+        return np.stack([np.diff(self.note_offsets), np.diff(self.target_offsets)], axis=1)
+
+    def _padded(self, ids):
+        padded = torch.full((self.max_length,), self.pad_token_id, dtype=torch.long)
+        padded[:len(ids)] = torch.from_numpy(ids.astype(np.int64))
+        return padded
+
+    def __getitem__(self, idx):
+        note = self.note_ids(idx)
+        if not self.pad:
+            return {
+                'input_ids': torch.from_numpy(note.astype(np.int64)),
+                'labels': torch.from_numpy(self.target_ids(idx).astype(np.int64)),
+            }
+        input_ids = self._padded(note)
+        attention_mask = torch.zeros(self.max_length, dtype=torch.long)
+        attention_mask[:len(note)] = 1
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': self._padded(self.target_ids(idx)),
+        }
+
+
+class DynamicPaddingCollator:
+    """
+    Pads a batch of unpadded examples to the longest note and longest target in the
+    batch. Label padding uses -100 so it is ignored by the loss.
+    """
+
+    def __init__(self, pad_token_id, label_pad_id=-100):
+        self.pad_token_id = pad_token_id
+        self.label_pad_id = label_pad_id
+
+    def __call__(self, examples):
+        input_len = max(len(ex['input_ids']) for ex in examples)
+        label_len = max(len(ex['labels']) for ex in examples)
+        input_ids = torch.full((len(examples), input_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(examples), input_len), dtype=torch.long)
+        labels = torch.full((len(examples), label_len), self.label_pad_id, dtype=torch.long)
+        for row, ex in enumerate(examples):
+            input_ids[row, :len(ex['input_ids'])] = ex['input_ids']
+            attention_mask[row, :len(ex['input_ids'])] = 1
+            labels[row, :len(ex['labels'])] = ex['labels']
+        return {'input_ids': input_ids, 'attention_mask': attention_mask, 'labels': labels}
+
+
+class TokenBudgetBatchSampler(Sampler):
+    """
+    Yields batches of dataset indices grouped by length.
+
+    Each epoch the indices are shuffled, cut into pools of pool_size examples and
+    sorted by length within each pool, so batches hold similarly sized examples while
+    the epoch stays random. lengths is either one length per example or one row of
+    lengths per example (e.g. note and target), each padded separately. A batch grows
+    until its padded size (batch size x sum of the longest of each column) would exceed
+    max_tokens, or until it holds max_batch_size examples.
+    Batch order is shuffled too. Call set_epoch() every epoch to reshuffle.
+    """
+
+    def __init__(self, lengths, max_tokens, max_batch_size=None, pool_size=1024, shuffle=True, seed=0):
+        self.lengths = np.asarray(lengths).reshape(len(lengths), -1)
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.pool_size = pool_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self._cache = None
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def num_batches(self, epoch):
+        """Number of batches in the given epoch; it varies a little from epoch to epoch."""
+        return len(self._batches(epoch))
+
+    def _batches(self, epoch=None):
+        epoch = self.epoch if epoch is None else epoch
+        if self._cache is not None and self._cache[0] == epoch:
+            return self._cache[1]
+        rng = random.Random(self.seed + epoch)
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            rng.shuffle(indices)
+
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = sorted(indices[start:start + self.pool_size], key=lambda i: self.lengths[i].sum())
+            batch, longest = [], np.zeros(self.lengths.shape[1], dtype=np.int64)
+            for i in pool:
+                longest_with_i = np.maximum(longest, self.lengths[i])
+                too_many_tokens = (len(batch) + 1) * longest_with_i.sum() > self.max_tokens
+                too_many_examples = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+                if batch and (too_many_tokens or too_many_examples):
+                    batches.append(batch)
+                    batch, longest_with_i = [], self.lengths[i]
+                batch.append(i)
+                longest = longest_with_i
+            if batch:
+                batches.append(batch)
+        if self.shuffle:
+            rng.shuffle(batches)
+        self._cache = (epoch, batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        return len(self._batches())
+
+
+class ResumableBatchSampler(Sampler):
+    """
+    Wraps a batch sampler so an epoch can start part-way through: set_epoch(epoch, start)
+    skips the first start batches of the epoch by index, without loading their examples.
+    len() is the number of batches still to come.
+    """
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        if hasattr(self.batch_sampler, "set_epoch"):
+            self.batch_sampler.set_epoch(epoch)
+        self.start = start
+
+    def __iter__(self):
+        return itertools.islice(iter(self.batch_sampler), self.start, None)
+
+    def __len__(self):
+        return max(0, len(self.batch_sampler) - self.start)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python flashcard_data.py <data.json|data.jsonl|shard_dir> <tokenizer_name> [output_prefix]")
+        sys.exit(1)
+
+    data_path, tokenizer_name = sys.argv[1], sys.argv[2]
+    output_prefix = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(data_path)[0] + ".tok"
+    print(f"Tokenizing {data_path}...")
+    pretokenize(data_path, tokenizer_name, output_prefix)
+    print(f"✅ Saved token ids to {output_prefix}.*")
+
+
+if __name__ == "__main__":
+    main()
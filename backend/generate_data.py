@@ -4,22 +4,29 @@
 This script does the following:
 1. Loads an educational dataset (you can later plug in SQuAD or others)
 2. Uses FLAN-T5 or GPT-2-large to auto-generate Q&A flashcards
-3. Saves the results in a clean JSON format with "question" and "answer" fields
+3. Saves the results as JSON lines with "question" and "answer" fields
+
+Notes are generated in batches. For GPT-2, FEW_SHOT_PROMPT is run through the model
+once and its key/value cache is shared by every note, so each batch only computes
+the note itself.
 """
 
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, GPT2LMHeadModel, GPT2Tokenizer
-import torch
+import argparse
+import itertools
 import json
-import os
-from datasets import load_dataset
+import time
+
+import torch
 from tqdm import tqdm
-import re
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, GPT2LMHeadModel, GPT2Tokenizer
+import qa_parser
 
 # ========== CONFIG ==========
 USE_FLAN_T5 = False  # Set to False to use GPT2-Large
 MODEL_NAME = "google/flan-t5-base" if USE_FLAN_T5 else "openai-community/gpt2-large"
 NUM_SAMPLES = 5  # How many notes to process from dataset
-OUTPUT_PATH = "generated_flashcards.json"
+BATCH_SIZE = 8   # Notes per generate() call
+OUTPUT_PATH = "generated_flashcards.jsonl"
 
 # Few-shot examples for GPT2
 FEW_SHOT_PROMPT = """
@@ -33,103 +40,170 @@ A: The mitochondria.
 
 """
 
+GPT2_GENERATION_KWARGS = dict(max_new_tokens=64, do_sample=True, top_k=50, top_p=0.95, temperature=0.7)
+
+
 # ========== LOAD MODEL ==========
-print(f"Loading model: {MODEL_NAME}")
-if USE_FLAN_T5:
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
-else:
-    tokenizer = GPT2Tokenizer.from_pretrained(MODEL_NAME)
-    model = GPT2LMHeadModel.from_pretrained(MODEL_NAME)
-    tokenizer.pad_token = tokenizer.eos_token
-    model.config.pad_token_id = tokenizer.eos_token_id
+def load_model(model_name, use_flan_t5):
+    print(f"Loading model: {model_name}")
+    if use_flan_t5:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    else:
+        tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+        model = GPT2LMHeadModel.from_pretrained(model_name)
+        tokenizer.pad_token = tokenizer.eos_token
+        model.config.pad_token_id = tokenizer.eos_token_id
+    model.eval()
+    return tokenizer, model
+
 
 # ========== LOAD DATA ==========
-print("Loading dataset (SQuAD for demo)...")
-dataset = load_dataset("squad", split="train[:1000]")
-notes = [item["context"] for item in dataset.select(range(NUM_SAMPLES))]
+def load_notes(num_samples, data_path=None):
+    if data_path:
+        from corpus import iter_records
+        return [record["note"] for record in itertools.islice(iter_records(data_path), num_samples)]
+    from datasets import load_dataset
+    print("Loading dataset (SQuAD for demo)...")
+    dataset = load_dataset("squad", split="train[:1000]")
+    return [item["context"] for item in dataset.select(range(num_samples))]
+
 
 # ========== DEBUG HELPER ==========
 def test_extraction(output_string):
     print("\n🔍 Raw model output:")
     print(output_string)
-    question, answer = None, None
-
-    qa_match = re.search(r"Q[:\uFF1A]\s*(.*?)\s*A[:\uFF1A]\s*(.*)", output_string, re.IGNORECASE | re.DOTALL)
-    if qa_match:
-        question, answer = qa_match.group(1).strip(), qa_match.group(2).strip()
-    else:
-        lines = output_string.split("\n")
-        q_candidates = [line.strip() for line in lines if line.strip().endswith("?")]
-        a_candidates = [line.strip() for line in lines if not line.strip().endswith("?") and len(line.strip()) > 1]
-        if q_candidates:
-            question = q_candidates[0]
-        if a_candidates:
-            answer = a_candidates[0]
-
+    parsed = qa_parser.parse(output_string, fallback=True)
     print("\n🧪 Extraction result:")
-    print("Question:", question)
-    print("Answer:  ", answer)
+    for card in parsed["cards"]:
+        print("Question:", card["question"])
+        print("Answer:  ", card["answer"])
+    for failure in parsed["failures"]:
+        print("Failed:  ", failure["reason"])
 
 # Uncomment below to test extraction manually
 # test_extraction("Q: What is the capital of France?\nA: Paris.")
 
+
 # ========== GENERATE FLASHCARDS ==========
-flashcards = []
-print("Generating flashcards...")
-
-for note in tqdm(notes):
-    if USE_FLAN_T5:
-        prompt = (
-            f"You are an AI assistant trained to create educational flashcards. "
-            f"Read the note below and extract one factual question and its answer. "
-            f"Your output must strictly follow this format:\n\n"
-            f"Q: <question>\nA: <answer>\n\n"
-            f"Note: {note}"
-        )
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, padding=True)
+def t5_prompt(note):
+    return (
+        f"You are an AI assistant trained to create educational flashcards. "
+        f"Read the note below and extract one factual question and its answer. "
+        f"Your output must strictly follow this format:\n\n"
+        f"Q: <question>\nA: <answer>\n\n"
+        f"Note: {note}"
+    )
+
+
+def generate_t5_batch(tokenizer, model, notes):
+    inputs = tokenizer([t5_prompt(note) for note in notes], return_tensors="pt", truncation=True, padding=True)
+    with torch.no_grad():
         outputs = model.generate(**inputs, max_length=128)
-        result = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    else:
-        prompt = FEW_SHOT_PROMPT + f"Note: {note}\nQ:"
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=64,
-            do_sample=True,
-            top_k=50,
-            top_p=0.95,
-            temperature=0.7
-        )
-        result = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        result = result.split("Note:")[-1].strip()
-
-    result = result.replace("Answer:", "A:").replace("Question:", "Q:")  # Normalize
-    print("\n--- MODEL OUTPUT ---\n", result)  # Debug print
-
-    # Extract Q and A using a fallback + heuristic-based method
-    question, answer = None, None
-    qa_match = re.search(r"Q[:\uFF1A]\s*(.*?)\s*A[:\uFF1A]\s*(.*)", result, re.IGNORECASE | re.DOTALL)
-    if qa_match:
-        question, answer = qa_match.group(1).strip(), qa_match.group(2).strip()
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+class GPT2FewShotGenerator:
+    """
+    Generates completions of FEW_SHOT_PROMPT + "Note: <note>\\nQ:" for a batch of notes.
+
+    The prefix is tokenized on its own and its key/value cache is computed once; every
+    batch expands that cache to its batch size (a view, not a copy) and only runs the
+    left-padded note suffixes. The attention mask spans prefix, padding and suffix, so
+    padding between the two is ignored and position ids stay contiguous.
+    With use_prefix_cache=False the same token ids are run from scratch instead.
+    """
+
+    def __init__(self, tokenizer, model, prefix=FEW_SHOT_PROMPT, use_prefix_cache=True, generation_kwargs=None):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.use_prefix_cache = use_prefix_cache
+        self.generation_kwargs = generation_kwargs or GPT2_GENERATION_KWARGS
+        self.prefix_ids = torch.tensor([tokenizer(prefix)["input_ids"]])
+        self.prefix_cache = None
+        if use_prefix_cache:
+            with torch.no_grad():
+                self.prefix_cache = model(self.prefix_ids, use_cache=True).past_key_values
+
+    def generate(self, notes):
+        self.tokenizer.padding_side = "left"
+        suffix = self.tokenizer([f"Note: {note}\nQ:" for note in notes], return_tensors="pt", padding=True)
+        batch_size = len(notes)
+        input_ids = torch.cat([self.prefix_ids.expand(batch_size, -1), suffix["input_ids"]], dim=1)
+        attention_mask = torch.cat([torch.ones_like(self.prefix_ids).expand(batch_size, -1),
+                                    suffix["attention_mask"]], dim=1)
+        kwargs = {}
+        if self.prefix_cache is not None:
+            kwargs["past_key_values"] = tuple(
+                tuple(tensor.expand(batch_size, -1, -1, -1) for tensor in layer) for layer in self.prefix_cache
+            )
+        with torch.no_grad():
+            outputs = self.model.generate(input_ids=input_ids, attention_mask=attention_mask,
+                                          pad_token_id=self.tokenizer.pad_token_id,
+                                          **self.generation_kwargs, **kwargs)
+        generated = self.tokenizer.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
+        # The prompt ends with "Q:"; anything after the model starts its own next note is dropped
+        return ["Q:" + text.split("Note:")[0].strip() for text in generated]
+
+
+def make_flashcard(note, result):
+    # One card is asked for per note, so only the first is kept
+    parsed = qa_parser.parse(result, fallback=True)
+    if parsed["cards"]:
+        card = parsed["cards"][0]
+        return {"input": note, "question": card["question"], "answer": card["answer"]}
+    reason = parsed["failures"][0]["reason"]
+    print(f"⚠️ Extraction failed ({reason}) for:\n", result, "\n")
+    return {"input": note, "question": None, "answer": None, "raw_output": result, "failure": reason}
+
+
+def generate_flashcards(notes, generate_batch, batch_size=BATCH_SIZE, output_path=None):
+    """Runs notes through generate_batch in batches, streaming each flashcard to output_path as JSON lines."""
+    flashcards = []
+    out = open(output_path, "w", encoding="utf-8") if output_path else None
+    try:
+        with tqdm(total=len(notes)) as progress:
+            for start in range(0, len(notes), batch_size):
+                batch = notes[start:start + batch_size]
+                for note, result in zip(batch, generate_batch(batch)):
+                    flashcard = make_flashcard(note, result)
+                    flashcards.append(flashcard)
+                    if out:
+                        out.write(json.dumps(flashcard, ensure_ascii=False) + "\n")
+                if out:
+                    out.flush()
+                progress.update(len(batch))
+    finally:
+        if out:
+            out.close()
+    return flashcards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Q&A flashcards with a local model")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--flan-t5", action="store_true", default=USE_FLAN_T5, help="Treat --model as a seq2seq model")
+    parser.add_argument("--num-samples", type=int, default=NUM_SAMPLES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--data", default=None, help="Read notes from a local corpus instead of SQuAD")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Recompute FEW_SHOT_PROMPT for every batch")
+    args = parser.parse_args()
+
+    tokenizer, model = load_model(args.model, args.flan_t5)
+    notes = load_notes(args.num_samples, args.data)
+    if args.flan_t5:
+        generate_batch = lambda batch: generate_t5_batch(tokenizer, model, batch)
     else:
-        lines = result.split("\n")
-        q_candidates = [line for line in lines if line.strip().endswith("?")]
-        a_candidates = [line for line in lines if not line.strip().endswith("?") and len(line.strip()) > 1]
-        if q_candidates:
-            question = q_candidates[0].strip()
-        if a_candidates:
-            answer = a_candidates[0].strip()
-
-    if question and answer:
-        flashcards.append({"input": note, "question": question, "answer": answer})
-    else:
-        print("⚠️ Extraction failed for:\n", result, "\n")
-        flashcards.append({"input": note, "question": None, "answer": None, "raw_output": result})
+        generate_batch = GPT2FewShotGenerator(tokenizer, model, use_prefix_cache=not args.no_prefix_cache).generate
+
+    print("Generating flashcards...")
+    start = time.perf_counter()
+    flashcards = generate_flashcards(notes, generate_batch, args.batch_size, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Saved {len(flashcards)} flashcards to {args.output} ({len(notes) / elapsed:.2f} notes/sec)")
+    print(" Done.")
 
-# ========== SAVE OUTPUT ==========
-print(f"Saving {len(flashcards)} flashcards to {OUTPUT_PATH}...")
-with open(OUTPUT_PATH, "w") as f:
-    json.dump(flashcards, f, indent=2, ensure_ascii=False)
 
-print(" Done.")
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
+import argparse
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 import openai
+import qa_parser
+from note_sections import split_into_note_sections
+
+LOCAL_MODEL_DIR = "finetuned_flan_t5_flashcards_v2"
+CONFIDENCE_THRESHOLD = 0.6  # Geometric-mean token probability below which a section goes to the remote model
+LOCAL_BATCH_SIZE = 16
+REMOTE_CONCURRENCY = 4
 
 def read_notes(file_path):
     """
@@ -40,6 +50,124 @@ def generate_flashcards(notes_text):
         print(f"Error calling the OpenAI API: {e}")
         sys.exit(1)
 
+def openai_section_client(section):
+    """
+    Remote tier: asks gpt-3.5-turbo for one flashcard for a single note section,
+    in the same "Q: ...\\nA: ..." format the local model produces.
+    """
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are an expert study assistant."},
+            {"role": "user", "content": "Write one flashcard for this note, formatted exactly as "
+                                        "\"Q: <question>\\nA: <answer>\":\n\n" + section},
+        ],
+        temperature=0.3,
+        max_tokens=150
+    )
+    return response["choices"][0]["message"]["content"].strip()
+
+def fake_section_client(section, latency=0.5):
+    # Offline stand-in for the remote tier, for testing the routing without an API key
+    time.sleep(latency)
+    return f"Q: What does this note say?\nA: {section}"
+
+class LocalT5Generator:
+    """
+    Local tier: the fine-tuned T5 model, run in length-sorted batches with greedy
+    decoding. Each output also gets a confidence, the geometric mean of its tokens'
+    probabilities, so unsure outputs can be sent to the remote tier.
+    """
+
+    def __init__(self, model_dir=LOCAL_MODEL_DIR, batch_size=LOCAL_BATCH_SIZE, max_input_tokens=256,
+                 max_output_tokens=64):
+        import torch
+        from transformers import T5Tokenizer, T5ForConditionalGeneration
+        self.torch = torch
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = T5Tokenizer.from_pretrained(model_dir)
+        self.model = T5ForConditionalGeneration.from_pretrained(model_dir).to(self.device).eval()
+        self.batch_size = batch_size
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+
+    def generate(self, sections):
+        """Returns (outputs, confidences) in the order of sections."""
+        token_ids = self.tokenizer(sections, truncation=True, max_length=self.max_input_tokens)["input_ids"]
+        order = sorted(range(len(sections)), key=lambda i: len(token_ids[i]))
+        outputs, confidences = [None] * len(sections), [0.0] * len(sections)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encoding = self.tokenizer.pad({"input_ids": [token_ids[i] for i in batch]}, return_tensors="pt")
+            with self.torch.no_grad():
+                generated = self.model.generate(input_ids=encoding["input_ids"].to(self.device),
+                                                attention_mask=encoding["attention_mask"].to(self.device),
+                                                max_length=self.max_output_tokens,
+                                                output_scores=True, return_dict_in_generate=True)
+                log_probs = self.model.compute_transition_scores(generated.sequences, generated.scores,
+                                                                 normalize_logits=True)
+            # Positions after a sequence has finished are padding and don't count
+            real = generated.sequences[:, 1:] != self.tokenizer.pad_token_id
+            mean_log_probs = (log_probs * real).sum(dim=1) / real.sum(dim=1).clamp(min=1)
+            decoded = self.tokenizer.batch_decode(generated.sequences, skip_special_tokens=True)
+            for i, text, mean_log_prob in zip(batch, decoded, mean_log_probs.exp().tolist()):
+                outputs[i] = text.strip()
+                confidences[i] = mean_log_prob
+        return outputs, confidences
+
+def tiered_generate(sections, local, remote_client, threshold=CONFIDENCE_THRESHOLD, concurrency=REMOTE_CONCURRENCY):
+    """
+    Generates one output per section: the local model handles every section first,
+    and sections whose output is below threshold confidence (or doesn't parse as a
+    flashcard) are escalated to remote_client(section) -> text, concurrently.
+    Returns (outputs, report), with outputs in section order.
+    """
+    start = time.perf_counter()
+    outputs, confidences = local.generate(sections) if sections else ([], [])
+    local_seconds = time.perf_counter() - start
+
+    escalate = [i for i, (output, confidence) in enumerate(zip(outputs, confidences))
+                if confidence < threshold or not qa_parser.parse(output)["cards"]]
+    remote_latencies = []
+
+    def call_remote(i):
+        call_start = time.perf_counter()
+        try:
+            return i, remote_client(sections[i]), time.perf_counter() - call_start
+        except Exception as e:
+            print(f"⚠️ Remote model failed on section {i}, keeping the local output: {e}")
+            return i, None, time.perf_counter() - call_start
+
+    remote_start = time.perf_counter()
+    if escalate:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for i, output, latency in pool.map(call_remote, escalate):
+                remote_latencies.append(latency)
+                if output is not None:
+                    outputs[i] = output
+    remote_seconds = time.perf_counter() - remote_start
+    total_seconds = time.perf_counter() - start
+
+    # What sending every section to the remote model at the same concurrency would have taken
+    avg_remote = sum(remote_latencies) / len(remote_latencies) if remote_latencies else None
+    all_remote_seconds = avg_remote * -(-len(sections) // concurrency) if avg_remote is not None else None
+    report = {
+        "sections": len(sections),
+        "local_sections": len(sections) - len(escalate),
+        "remote_sections": len(escalate),
+        "local_seconds": local_seconds,
+        "remote_seconds": remote_seconds,
+        "total_seconds": total_seconds,
+        "avg_remote_latency_seconds": avg_remote,
+        "estimated_all_remote_seconds": all_remote_seconds,
+        "estimated_latency_saved_seconds": all_remote_seconds - total_seconds if all_remote_seconds else None,
+    }
+    return outputs, report
+
+def format_flashcards(outputs):
+    cards = [card for output in outputs for card in qa_parser.parse(output)["cards"]]
+    return "\n\n".join(f"Q: {card['question']}\nA: {card['answer']}" for card in cards)
+
 def save_text_to_file(text, file_path):
     """
     Saves the provided text to the specified file, replacing it if it exists.
@@ -49,17 +177,24 @@ def save_text_to_file(text, file_path):
     print(f"Flashcards successfully saved to {file_path}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate flashcards from a notes text file")
+    parser.add_argument("notes_file")
+    parser.add_argument("--tiered", action="store_true",
+                        help="Run the local model on each section first and only send unsure sections to the API")
+    parser.add_argument("--model-dir", default=LOCAL_MODEL_DIR)
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=LOCAL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=REMOTE_CONCURRENCY)
+    parser.add_argument("--fake-remote", action="store_true", help="Use an offline fake instead of the API")
+    args = parser.parse_args()
+
     # Make sure the OpenAI API key is set in your environment.
     openai.api_key = os.getenv("OPENAI_API_KEY")
-    if openai.api_key is None:
+    if openai.api_key is None and not args.fake_remote:
         print("Error: The OPENAI_API_KEY environment variable is not set.")
         sys.exit(1)
 
-    if len(sys.argv) < 2:
-        print("Usage: python generate_flashcards.py <notes_text_file>")
-        sys.exit(1)
-
-    notes_file = sys.argv[1]
+    notes_file = args.notes_file
 
     try:
         notes_text = read_notes(notes_file)
@@ -68,7 +203,20 @@ def main():
         sys.exit(1)
 
     print("Generating flashcards from notes...")
-    flashcards = generate_flashcards(notes_text)
+    if args.tiered:
+        sections = split_into_note_sections(notes_text)
+        local = LocalT5Generator(args.model_dir, batch_size=args.batch_size)
+        remote_client = fake_section_client if args.fake_remote else openai_section_client
+        outputs, report = tiered_generate(sections, local, remote_client, args.threshold, args.concurrency)
+        flashcards = format_flashcards(outputs)
+        print(f"📊 {report['local_sections']} sections by the local model, {report['remote_sections']} by the API "
+              f"in {report['total_seconds']:.1f}s")
+        saved = report["estimated_latency_saved_seconds"]
+        if saved is not None:
+            print(f"⏱️ About {abs(saved):.1f}s {'faster' if saved >= 0 else 'slower'} than sending every section "
+                  f"to the API")
+    else:
+        flashcards = generate_flashcards(notes_text)
 
     # Save flashcards to a file in the same directory as the notes text file.
     dir_name = os.path.dirname(os.path.abspath(notes_file))
@@ -1,90 +1,246 @@
 import base64
+import io
 import requests
 import os
+import threading
 import openai
-from PIL import Image
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageOps
 import cv2
-import re
+import time
+from ocr_cache import OCRCache
+from text_cleaner import TextCleaner
+import tracing
 
 openai.api_key = os.getenv("OPENAI_API_KEY")  # or set directly: openai.api_key = "sk-..."
 
+VISION_MODEL = "gpt-4o"
+VISION_PROMPT = (
+    "Please extract all readable text from this handwritten note image. Also, convert any mathematical symbols, variables, or notation into plain descriptive text (e.g., '∑' becomes 'summation', 'P(X|Y)' becomes 'probability of X given Y'). When giving your response, don't give any lead up like 'Sure, here is your answer...', only give the transcribed text"
+)
+
+# Transcriptions are cached on disk keyed by image content, prompt and model
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "1") == "1"
+ocr_cache = None
+if OCR_CACHE_ENABLED:
+    ocr_cache = OCRCache(os.getenv("OCR_CACHE_DIR", "ocr_cache"),
+                         max_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+
+# Preamble phrases and cleanup regexes applied to every transcription
+CLEAN_RULES_PATH = os.getenv("CLEAN_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "clean_rules.json"))
+text_cleaner = TextCleaner.from_file(CLEAN_RULES_PATH)
+
+# Pages are downscaled, converted to grayscale with stretched contrast and re-encoded
+# as JPEG before upload; handwriting stays legible while phone photos shrink ~10-50x
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1") == "1"
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "1600"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+OCR_PREPROCESS_WORKERS = int(os.getenv("OCR_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "4"))  # Vision requests in flight for multi-page uploads
+
+def preprocess_image(image_bytes, max_edge=OCR_MAX_EDGE, grayscale=OCR_GRAYSCALE, jpeg_quality=OCR_JPEG_QUALITY):
+    """Returns the image resized to fit max_edge and re-encoded as JPEG, or the original bytes if those are smaller."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # For JPEGs, let the decoder downscale by up to 8x in the DCT domain instead of
+        # decoding every pixel of a 12-megapixel photo only to throw most of them away
+        scale = min(1.0, max_edge / max(image.size))
+        image.draft("L" if grayscale else "RGB", (int(image.width * scale), int(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if grayscale:
+            image = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=jpeg_quality, optimize=True)
+    processed = out.getvalue()
+    return processed if len(processed) < len(image_bytes) else image_bytes
+
+def _preprocess_signature():
+    if not OCR_PREPROCESS:
+        return "raw"
+    return f"edge={OCR_MAX_EDGE},gray={OCR_GRAYSCALE},q={OCR_JPEG_QUALITY}"
+
+_preprocess_pool = None
+_preprocess_pool_lock = threading.Lock()
+
+def _run_preprocess(image_bytes):
+    # Pillow releases the GIL while decoding, resizing and encoding, so a thread pool
+    # bounds how many pages are preprocessed at once without starting any processes
+    global _preprocess_pool
+    if OCR_PREPROCESS_WORKERS <= 0:
+        return preprocess_image(image_bytes)
+    with _preprocess_pool_lock:
+        if _preprocess_pool is None:
+            _preprocess_pool = ThreadPoolExecutor(OCR_PREPROCESS_WORKERS, thread_name_prefix="ocr-preprocess")
+    return _preprocess_pool.submit(preprocess_image, image_bytes).result()
+
+class InFlightRequests:
+    """
+    Coalesces concurrent requests for the same key: the first caller runs the work,
+    and callers arriving while it's running wait for and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.coalesced = 0
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._futures[key]
+        return future.result()
+
+in_flight = InFlightRequests()
+_stats_lock = threading.Lock()
+_stats = {"pages": 0, "original_bytes": 0, "sent_bytes": 0, "preprocess_seconds": 0.0, "vision_seconds": 0.0}
+
+def ocr_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["coalesced"] = in_flight.coalesced
+    stats["avg_sent_bytes"] = stats["sent_bytes"] / stats["pages"] if stats["pages"] else 0
+    stats["avg_vision_ms"] = 1000 * stats["vision_seconds"] / stats["pages"] if stats["pages"] else 0
+    return stats
+
 def encode_image(image_path):
     with open(image_path, "rb") as img_file:
-        b64_image = base64.b64encode(img_file.read()).decode("utf-8")
+        image_bytes = img_file.read()
+    if OCR_PREPROCESS:
+        image_bytes = preprocess_image(image_bytes)
+    b64_image = base64.b64encode(image_bytes).decode("utf-8")
     return b64_image
 
-def describe_image_with_gpt4(image_path):
-    base64_image = encode_image(image_path)
+def openai_vision_client(base64_image, prompt, model):
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}"
+                    }},
+                ],
+            }
+        ],
+        max_tokens=1024
+    )
+    return response['choices'][0]['message']['content']
+
+def stub_vision_client(base64_image, prompt, model):
+    # Offline stand-in for the vision API, used for tests and benchmarks
+    return "Sure, here is the extracted text:\n- Water boils at 100 degrees Celsius.\n- The mitochondria is the powerhouse of the cell."
+
+vision_client = stub_vision_client if os.getenv("OCR_VISION_STUB") == "1" else openai_vision_client
+
+def set_vision_client(client):
+    """
+    Replaces the function used to transcribe images. It is called as
+    client(base64_image, prompt, model) and must return the raw transcription.
+    """
+    global vision_client
+    vision_client = client
+
+class OCRError(Exception):
+    """A page couldn't be transcribed by the vision model."""
 
+def describe_image_with_gpt4(image_path):
+    # The single-page routes show the error as the page's text
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": (
-                            "Please extract all readable text from this handwritten note image. Also, convert any mathematical symbols, variables, or notation into plain descriptive text (e.g., '∑' becomes 'summation', 'P(X|Y)' becomes 'probability of X given Y'). When giving your response, don't give any lead up like 'Sure, here is your answer...', only give the transcribed text" 
-                        )},
-                        {"type": "image_url", "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }},
-                    ],
-                }
-            ],
-            max_tokens=1024
-        )
-
-        content = response['choices'][0]['message']['content']
-        return clean_extracted_text(content)
+        return transcribe_image(image_path)
+    except OCRError as e:
+        return f"❌ Error calling GPT-4 Vision: {e}"
+
+def transcribe_image(image_path):
+    """Transcribes and cleans one page, raising OCRError if the vision call fails."""
+    with open(image_path, "rb") as img_file:
+        image_bytes = img_file.read()
+
+    # The key covers preprocessing settings too, since they change what the model sees
+    request_key = OCRCache.make_key(image_bytes, VISION_PROMPT, f"{VISION_MODEL}|{_preprocess_signature()}")
+    if ocr_cache is not None:
+        cached = ocr_cache.get(request_key)
+        if cached is not None:
+            return cached
+    return in_flight.run(request_key, lambda: _transcribe(image_bytes, request_key))
 
+def _transcribe(image_bytes, cache_key):
+    try:
+        start = time.perf_counter()
+        with tracing.span("ocr_preprocess"):
+            payload = _run_preprocess(image_bytes) if OCR_PREPROCESS else image_bytes
+        preprocessed = time.perf_counter()
+        with tracing.span("ocr_vision", sent_bytes=len(payload)):
+            base64_image = base64.b64encode(payload).decode("utf-8")
+            content = vision_client(base64_image, VISION_PROMPT, VISION_MODEL)
+        cleaned = clean_extracted_text(content)
     except Exception as e:
-        return f"❌ Error calling GPT-4 Vision: {e}"
+        raise OCRError(str(e)) from e
+
+    with _stats_lock:
+        _stats["pages"] += 1
+        _stats["original_bytes"] += len(image_bytes)
+        _stats["sent_bytes"] += len(payload)
+        _stats["preprocess_seconds"] += preprocessed - start
+        _stats["vision_seconds"] += time.perf_counter() - preprocessed
+    if ocr_cache is not None:
+        ocr_cache.put(cache_key, cleaned, miss_seconds=time.perf_counter() - start)
+    return cleaned
+
+def _describe_page(image_path):
+    try:
+        return transcribe_image(image_path), None
+    except (OCRError, OSError) as e:
+        return None, str(e)
+
+def describe_images(image_paths, max_concurrency=OCR_CONCURRENCY):
+    """
+    Transcribes several pages with up to max_concurrency requests in flight. Returns a
+    (text, error) pair per page, in page order: error is None for pages that were
+    transcribed, and text is None for pages that failed, so one bad page doesn't
+    lose the others.
+    """
+    if len(image_paths) <= 1 or max_concurrency <= 1:
+        return [_describe_page(path) for path in image_paths]
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(image_paths))) as pool:
+        return list(pool.map(tracing.traced(_describe_page), image_paths))
 
-import re
 
 def clean_extracted_text(raw_text):
-    drop_phrases = [
-        "Sure, here is the extracted text",
-        "Here is the extracted text",
-        "Below is the extracted text",
-        "This is what the note says",
-        "The handwritten note contains the following text",
-        "Generated text:",
-        "Transcribed content:",
-        "Sure, here's the extracted text and converted notation from the handwritten image:",
-        "Sure! Here's the extracted text with mathematical notation converted to plain descriptive text:",
-        "Certainly! Here's the transcription and conversion:",
-        "Certainly! Here is the text extracted and converted:",
-        "Sure, here’s the text extracted from the handwritten note:"
-
-    ]
-    
-    # Normalize newlines and strip whitespace
-    lines = raw_text.strip().splitlines()
-
-    # Remove leading phrases
-    for i, line in enumerate(lines):
-        for phrase in drop_phrases:
-            if phrase.lower() in line.lower():
-                return "\n".join(lines[i + 1:]).strip()
-
-    # Fallback: remove markdown/code fences or GPT-generated headers
-    cleaned = re.sub(r"^```(?:\w+)?|```$", "", raw_text, flags=re.MULTILINE)
-    cleaned = re.sub(r"(?i)^.*?(generated|transcribed|extracted) (text|content):", "", cleaned)
-
-    return cleaned.strip()
+    with tracing.span("clean"):
+        return text_cleaner.clean(raw_text)
 
 
 def main():
     import sys
     if len(sys.argv) < 2:
-        print("Usage: python convert_notes_to_text_gpt4.py <path_to_image>")
+        print("Usage: python convert_notes_to_text_gpt4.py <path_to_image> [more pages...]")
         sys.exit(1)
 
     image_path = sys.argv[1]
     print("🧠 Sending image to GPT-4 Vision...")
-    result = describe_image_with_gpt4(image_path)
+    pages = describe_images(sys.argv[1:])
+    for path, (_, error) in zip(sys.argv[1:], pages):
+        if error:
+            print(f"❌ {path}: {error}")
+    result = "\n\n".join(text for text, _ in pages if text is not None)
 
     output_path = os.path.join(os.path.dirname(os.path.abspath(image_path)), "ocr_output.txt")
     with open(output_path, "w", encoding="utf-8") as f:
@@ -0,0 +1,145 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import torch
+from transformers import GenerationConfig, T5Config, T5ForConditionalGeneration
+
+BACKENDS = ("eager", "int8", "onnx")
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def load_safetensors_mmap(path):
+    """
+    Returns a state dict whose tensors point straight into a memory-mapped safetensors
+    file instead of being copied into process memory. The mapping is copy-on-write, so
+    pages stay shared with the OS page cache (and with every other process mapping the
+    same file) unless a tensor is written to.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            state_dict[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=(end - start) // dtype.itemsize,
+                                  offset=8 + header_size + start)
+        state_dict[name] = tensor.view(info["shape"])
+    return state_dict
+
+
+def safetensors_files(model_dir):
+    return sorted(glob.glob(os.path.join(model_dir, "*.safetensors")))
+
+
+def load_mmap_weights(model_dir):
+    """Builds the model without allocating weights and assigns mmap-backed tensors to it."""
+    config = T5Config.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = T5ForConditionalGeneration(config)
+
+    state_dict = {}
+    for path in safetensors_files(model_dir):
+        state_dict.update(load_safetensors_mmap(path))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"{model_dir} is missing weights for: {', '.join(missing[:5])}")
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(model_dir)
+    except OSError:
+        model.generation_config = GenerationConfig.from_model_config(config)
+    return model
+
+
+def load_eager(model_dir, device):
+    # On CPU, safetensors checkpoints are mapped rather than read into memory
+    if device.type == "cpu" and safetensors_files(model_dir):
+        model = load_mmap_weights(model_dir)
+    else:
+        model = T5ForConditionalGeneration.from_pretrained(model_dir)
+        model.to(device)
+    model.eval()
+    return model
+
+
+def load_int8(model_dir, device):
+    # Dynamic quantization stores Linear weights as int8 and only runs on CPU
+    model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def weights_fingerprint(model_dir):
+    """
+    Identifies the current weights in model_dir by the names, sizes and modification
+    times of its weight and config files, without reading them.
+    """
+    paths = sorted(glob.glob(os.path.join(model_dir, "*.safetensors")) + glob.glob(os.path.join(model_dir, "*.bin"))
+                   + glob.glob(os.path.join(model_dir, "config.json")))
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+ONNX_SOURCE_FILE = "source_fingerprint.json"
+
+
+def onnx_dir_for(model_dir):
+    return model_dir.rstrip("/\\") + "_onnx"
+
+
+def onnx_export_is_current(model_dir, onnx_dir):
+    try:
+        with open(os.path.join(onnx_dir, ONNX_SOURCE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint") == weights_fingerprint(model_dir)
+    except (OSError, ValueError):
+        return False
+
+
+def load_onnx(model_dir, device):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    # Prefer a directory written by export_onnx.py from these weights, otherwise export on the fly
+    onnx_dir = onnx_dir_for(model_dir)
+    if os.path.isdir(onnx_dir):
+        if onnx_export_is_current(model_dir, onnx_dir):
+            return ORTModelForSeq2SeqLM.from_pretrained(onnx_dir, use_cache=True)
+        print(f"⚠️ {onnx_dir} was exported from other weights than {model_dir}; exporting again")
+    return ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True, use_cache=True)
+
+
+def load_backend(name, model_dir, device):
+    """
+    Loads the fine-tuned T5 with the given inference backend. Every backend returns
+    an object with the transformers generate() interface, so callers don't change:
+      eager - full precision PyTorch (default)
+      int8  - PyTorch with dynamically quantized int8 Linear layers, CPU only
+      onnx  - ONNX Runtime encoder + decoder-with-past, reusing the KV cache while decoding
+    """
+    if name == "eager":
+        return load_eager(model_dir, device)
+    if name == "int8":
+        return load_int8(model_dir, device)
+    if name == "onnx":
+        return load_onnx(model_dir, device)
+    raise ValueError(f"Unknown inference backend {name!r}, expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import tracing
+
+
+class InferenceScheduler:
+    """
+    Collects note sections from concurrent requests into micro-batches.
+
+    A single background thread owns the model: it waits for the first queued
+    section, keeps collecting until max_batch_size sections are queued or
+    max_wait_ms has passed, runs them through generate_batch_fn(notes, stats=dict)
+    in one call and hands each result back to the request that submitted it.
+
+    Per request, stats() reports the time its sections spent queued (until the
+    last of them was taken into a batch), the time from then until its results
+    were ready, and the total. Each batch runs under its own trace; its spans and
+    the request's share of its counts are added to the trace of every request in
+    it, after a scheduler_wait span for the time the request spent queued.
+    """
+
+    def __init__(self, generate_batch_fn, max_batch_size=16, max_wait_ms=10, history_size=1000):
+        self.generate_batch_fn = generate_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._wait_times = deque(maxlen=history_size)
+        self._service_times = deque(maxlen=history_size)
+        self._latencies = deque(maxlen=history_size)
+        self._requests = 0
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                self._running = True
+            self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background thread after the batch it's running. Sections still queued
+        fail with RuntimeError, and so does any later submit() until start() is called again.
+        """
+        with self._lock:
+            self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # submit() only queues while running, under the lock, so nothing is added after this
+        while True:
+            try:
+                _, future, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, notes, timeout=None, stats=None):
+        """
+        Queues all notes of one request and blocks until every one has been generated.
+        Returns the generated texts in the same order as notes. If stats is a dict, the
+        token counts generate_batch_fn reports for each batch are added to it, split
+        between the batch's requests by their share of its sections.
+        """
+        if not notes:
+            return []
+        enqueued_at = time.perf_counter()
+        # Shared by all of this request's notes; waiting_since moves on after each of its batches
+        pending = {"stats": stats, "trace": tracing.current_trace(), "waiting_since": enqueued_at}
+        futures = []
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("Inference scheduler is not running")
+            for note in notes:
+                future = Future()
+                self._queue.put((note, future, pending))
+                futures.append(future)
+        outcomes = [future.result(timeout=timeout) for future in futures]
+        finished_at = time.perf_counter()
+        dequeued_at = max(started for _, started in outcomes)
+        with self._lock:
+            self._requests += 1
+            self._wait_times.append(dequeued_at - enqueued_at)
+            self._service_times.append(finished_at - dequeued_at)
+            self._latencies.append(finished_at - enqueued_at)
+        return [result for result, _ in outcomes]
+
+    def stats(self):
+        with self._lock:
+            times = {"request_wait_ms": sorted(self._wait_times),
+                     "request_service_ms": sorted(self._service_times),
+                     "request_latency_ms": sorted(self._latencies)}
+            histogram = dict(sorted(self._batch_sizes.items()))
+            requests = self._requests
+
+        def summary(values):
+            def percentile(p):
+                return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+            return {"p50": percentile(0.50) * 1000, "p95": percentile(0.95) * 1000,
+                    "max": (values[-1] if values else 0.0) * 1000}
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": requests,
+            "batches": sum(histogram.values()),
+            "batch_size_histogram": histogram,
+            **{name: summary(values) for name, values in times.items()},
+        }
+
+    def _collect_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            started_at = time.perf_counter()
+            notes = [note for note, _, _ in batch]
+            batch_stats = {}
+            batch_trace = tracing.Trace("scheduler_batch")
+            try:
+                with tracing.recording(batch_trace):
+                    results = self.generate_batch_fn(notes, stats=batch_stats)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+
+            # A request's stats and trace are only read after all its futures are done
+            sections = Counter(id(pending) for _, _, pending in batch)
+            requests = {id(pending): pending for _, _, pending in batch}
+            for key, pending in requests.items():
+                share = sections[key] / len(batch)
+                if pending["stats"] is not None:
+                    for name, value in batch_stats.items():
+                        pending["stats"][name] = pending["stats"].get(name, 0) + value * share
+                if pending["trace"] is not None:
+                    tracing.add_span(pending["trace"], "scheduler_wait", pending["waiting_since"], started_at)
+                    tracing.merge(pending["trace"], batch_trace, share)
+                pending["waiting_since"] = finished_at
+            for (_, future, _), result in zip(batch, results):
+                future.set_result((result, started_at))
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def new_job(job_input):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "stage": None,
+        "input": job_input,
+        "result": {},
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class InMemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = json.loads(json.dumps(job))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(json.loads(json.dumps(fields)))
+            job["updated_at"] = time.time()
+
+    def claim(self, job_id, owner):
+        """Marks a queued job as running by owner; returns False if it isn't queued."""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] != QUEUED:
+                return False
+            job.update(status=RUNNING, owner=owner, updated_at=time.time())
+            return True
+
+    def requeue_running(self, owner=None):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == RUNNING and (owner is None or job.get("owner") == owner):
+                    job.update(status=QUEUED, stage=None, updated_at=time.time())
+
+    def queued(self):
+        with self._lock:
+            return [job_id for job_id, job in self._jobs.items() if job["status"] == QUEUED]
+
+
+class SQLiteJobStore:
+    """
+    Keeps each job as a JSON document in a SQLite table, so job state outlives
+    the process and unfinished jobs can be picked up again after a restart. Several
+    processes can share one database: jobs are claimed in a write transaction, so
+    each runs in exactly one of them.
+    """
+
+    def __init__(self, path="jobs.db"):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, data TEXT)")
+            self._db.commit()
+
+    def create(self, job):
+        with self._lock:
+            self._db.execute("INSERT INTO jobs (id, status, data) VALUES (?, ?, ?)",
+                             (job["id"], job["status"], json.dumps(job)))
+            self._db.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            job = json.loads(row[0])
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._db.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?",
+                             (job["status"], json.dumps(job), job_id))
+            self._db.commit()
+
+    def claim(self, job_id, owner):
+        """Marks a queued job as running by owner; returns False if it isn't queued (e.g. another process has it)."""
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so no other process can claim in between
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT data FROM jobs WHERE id = ? AND status = ?",
+                                       (job_id, QUEUED)).fetchone()
+                if row is None:
+                    return False
+                job = json.loads(row[0])
+                job.update(status=RUNNING, owner=owner, updated_at=time.time())
+                self._db.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?", (RUNNING, json.dumps(job), job_id))
+                return True
+            finally:
+                self._db.commit()
+
+    def requeue_running(self, owner=None):
+        """Puts running jobs (only owner's, if given) back in the queue, e.g. after their process died."""
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for (data,) in rows:
+                job = json.loads(data)
+                if owner is None or job.get("owner") == owner:
+                    job.update(status=QUEUED, stage=None, updated_at=time.time())
+                    self._db.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ? AND status = ?",
+                                     (QUEUED, json.dumps(job), job["id"], RUNNING))
+            self._db.commit()
+
+    def queued(self):
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM jobs WHERE status = ?", (QUEUED,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobManager:
+    """
+    Runs jobs on a thread pool and records their progress in a job store.
+
+    pipeline(job_input, report) does the actual work. It calls report(stage, **result)
+    as it moves through its stages; every keyword is merged into the job's result, so
+    clients polling the store see partial results. Its return value is merged in last.
+    Each run is traced like a request, named trace_name(job_input) ("job" by default).
+    """
+
+    def __init__(self, store, pipeline, max_workers=2, trace_name=None):
+        self.store = store
+        self.pipeline = pipeline
+        self.trace_name = trace_name or (lambda job_input: "job")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, job_input):
+        job = new_job(job_input)
+        self.store.create(job)
+        self._pool.submit(self._run, job["id"])
+        return job["id"]
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def resume_unfinished(self, requeue_running=True):
+        """
+        Picks up jobs left queued when the previous process stopped, and with
+        requeue_running also the ones it was running. Pass requeue_running=False
+        when other live processes share the store, since their running jobs aren't
+        abandoned; whoever manages those processes requeues a dead one's jobs.
+        """
+        if requeue_running:
+            self.store.requeue_running()
+        job_ids = self.store.queued()
+        for job_id in job_ids:
+            self._pool.submit(self._run, job_id)
+        return job_ids
+
+    def _run(self, job_id):
+        # Another process sharing the store (or an earlier submit) may already have it
+        if not self.store.claim(job_id, os.getpid()):
+            return
+        job = self.store.get(job_id)
+        result = dict(job["result"])
+        timings = {}
+        current = [None, time.perf_counter()]  # Stage in progress and when it started
+
+        def report(stage, **partial):
+            now = time.perf_counter()
+            if stage != current[0]:
+                if current[0] is not None:
+                    timings[current[0]] = now - current[1]
+                current[:] = [stage, now]
+            result.update(partial)
+            self.store.update(job_id, status=RUNNING, stage=stage, result=dict(result, timings=timings))
+
+        trace, token = tracing.start_trace(self.trace_name(job["input"]))
+        try:
+            final = self.pipeline(job["input"], report) or {}
+            report(None, **final)
+            self.store.update(job_id, status=DONE, stage=None)
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            tracing.finish_trace(trace, token)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -1,61 +1,406 @@
+import time
+_import_start = time.perf_counter()
+
 import os
+import re
+import json
+import hashlib
+import threading
+import zipfile
 import torch
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from hand_to_text import describe_image_with_gpt4, clean_extracted_text
+from transformers import T5Tokenizer
+import hand_to_text
+import qa_parser
+import tracing
+from hand_to_text import describe_image_with_gpt4, describe_images, clean_extracted_text
+from note_sections import split_into_note_sections
+from inference_scheduler import InferenceScheduler
+from flashcard_cache import FlashcardCache
+from jobs import JobManager, InMemoryJobStore, SQLiteJobStore
+from inference_backends import load_backend, weights_fingerprint
+
+startup_timings = {"imports": time.perf_counter() - _import_start}
 
 UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+# Limits for /upload_batch, which takes many images or zips of images in one request
+MAX_BATCH_PAGES = int(os.getenv("FLASHCARDS_MAX_BATCH_PAGES", "200"))
+MAX_BATCH_BYTES = int(os.getenv("FLASHCARDS_MAX_BATCH_BYTES", str(200 * 1024 * 1024)))
+MAX_BATCH_SIZE = int(os.getenv("FLASHCARDS_MAX_BATCH_SIZE", "16"))  # Note sections per model.generate call
+MAX_INPUT_TOKENS = 256
+MAX_OUTPUT_TOKENS = 64
+# "split" breaks sections longer than MAX_INPUT_TOKENS into several inputs, "truncate" cuts them off
+TRUNCATION_POLICY = os.getenv("FLASHCARDS_TRUNCATION_POLICY", "split")
+# Micro-batch note sections across concurrent /generate requests
+USE_SCHEDULER = os.getenv("FLASHCARDS_USE_SCHEDULER", "0") == "1"
+SCHEDULER_MAX_WAIT_MS = float(os.getenv("FLASHCARDS_SCHEDULER_MAX_WAIT_MS", "10"))
+# Generated flashcards are memoized per note section; set a path to also keep them on disk
+FLASHCARD_CACHE_SIZE = int(os.getenv("FLASHCARDS_CACHE_SIZE", "4096"))
+FLASHCARD_CACHE_PATH = os.getenv("FLASHCARDS_CACHE_PATH")
+# Background jobs for /jobs; set a database path to keep job state across restarts
+JOB_WORKERS = int(os.getenv("FLASHCARDS_JOB_WORKERS", "2"))
+JOB_DB_PATH = os.getenv("FLASHCARDS_JOB_DB")
+# Inference backend: "eager" (PyTorch), "int8" (quantized PyTorch, CPU) or "onnx" (ONNX Runtime, CPU)
+INFERENCE_BACKEND = os.getenv("FLASHCARDS_BACKEND", "eager")
+# Every request is traced into the /metrics histograms; set a directory to also sample
+# stacks while requests run and keep flame data for the slowest ones there
+PROFILE_DIR = os.getenv("FLASHCARDS_PROFILE_DIR")
+PROFILE_KEEP = int(os.getenv("FLASHCARDS_PROFILE_KEEP", "10"))
+PROFILE_INTERVAL_MS = float(os.getenv("FLASHCARDS_PROFILE_INTERVAL_MS", "5"))
 
 # Flask setup
 app = Flask(__name__)
 CORS(app)  # Enables access from React frontend
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+if PROFILE_DIR:
+    tracing.enable_profiler(PROFILE_DIR, PROFILE_INTERVAL_MS / 1000, PROFILE_KEEP)
 
-# Load model and tokenizer
+# Model and tokenizer are loaded on first use (or by warm_up), not at import time
 model_dir = "finetuned_flan_t5_flashcards_v2"
-tokenizer = T5Tokenizer.from_pretrained(model_dir)
-model = T5ForConditionalGeneration.from_pretrained(model_dir)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+use_cuda = torch.cuda.is_available() and INFERENCE_BACKEND == "eager"
+device = torch.device("cuda" if use_cuda else "cpu")
+tokenizer = None
+model = None
+model_ready = False
+_model_lock = threading.Lock()
+
+# Representative notes run once at startup so the first real request doesn't pay warm-up costs
+WARMUP_NOTES = [
+    "Harry Truman was President when the first Peanuts cartoon was published.",
+    "Water boils at 100 degrees Celsius at sea level.",
+    "The mitochondria is the powerhouse of the cell, producing most of its ATP through cellular respiration.",
+]
+
+flashcard_cache = FlashcardCache(max_entries=FLASHCARD_CACHE_SIZE, disk_path=FLASHCARD_CACHE_PATH)
+
+def get_model():
+    """Returns (tokenizer, model), loading both on the first call. Safe to call from any thread."""
+    global tokenizer, model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                start = time.perf_counter()
+                new_tokenizer = T5Tokenizer.from_pretrained(model_dir)
+                startup_timings["tokenizer"] = time.perf_counter() - start
+                start = time.perf_counter()
+                new_model = load_backend(INFERENCE_BACKEND, model_dir, device)
+                startup_timings["weights"] = time.perf_counter() - start
+                tokenizer = new_tokenizer
+                model = new_model
+    return tokenizer, model
+
+def warm_up():
+    """Loads the model, runs WARMUP_NOTES through it and marks the backend ready."""
+    global model_ready
+    get_model()
+    start = time.perf_counter()
+    generate_flashcards_batch(WARMUP_NOTES)
+    startup_timings["warmup"] = time.perf_counter() - start
+    model_ready = True
+    app.logger.info("Startup: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items()))
+
+def reload_model(new_model_dir):
+    """
+    Loads a different (or retrained) model in place of the current one and
+    invalidates every cached flashcard generated by the old weights.
+    """
+    global model_dir, tokenizer, model
+    new_tokenizer = T5Tokenizer.from_pretrained(new_model_dir)
+    new_model = load_backend(INFERENCE_BACKEND, new_model_dir, device)
+    with _model_lock:
+        model_dir, tokenizer, model = new_model_dir, new_tokenizer, new_model
+    _weights_fingerprints.clear()
+    flashcard_cache.clear()
 
 # Helper functions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def generate_flashcard(note_text, max_length=256):
-    encoding = tokenizer(note_text, return_tensors="pt", padding="max_length",
-                         truncation=True, max_length=max_length)
+def store_upload(data, original_name):
+    """
+    Saves an uploaded image under the hash of its content, so re-uploads of the same
+    page are stored once and different files with the same name never overwrite
+    each other. original_name is the client's name, already checked by allowed_file;
+    only its extension is kept. Returns the stored filename.
+    """
+    extension = os.path.splitext(original_name)[1].lower()
+    filename = f"{hashlib.sha256(data).hexdigest()}{extension}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(filepath):
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    return filename
+
+def iter_uploaded_pages(files):
+    """
+    Yields (name, bytes) for every image in files, in upload order; zip archives are
+    expanded in place, their images in name order. Raises ValueError past the batch limits.
+    """
+    pages = total_bytes = 0
+
+    def check(size):
+        nonlocal pages, total_bytes
+        pages += 1
+        total_bytes += size
+        if pages > MAX_BATCH_PAGES:
+            raise ValueError(f"At most {MAX_BATCH_PAGES} pages per batch")
+        if total_bytes > MAX_BATCH_BYTES:
+            raise ValueError(f"At most {MAX_BATCH_BYTES} bytes per batch")
+
+    for file in files:
+        name = file.filename or ""
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(file.stream) as archive:
+                members = [m for m in archive.infolist()
+                           if not m.is_dir() and not m.filename.startswith("__MACOSX/") and allowed_file(m.filename)]
+                for member in sorted(members, key=lambda m: m.filename):
+                    # Checked against the declared size before decompressing anything
+                    check(member.file_size)
+                    yield member.filename, archive.read(member)
+        elif allowed_file(name):
+            data = file.read()
+            check(len(data))
+            yield name, data
+        else:
+            raise ValueError(f"Invalid file type: {name}")
+
+def generate_flashcard(note_text, max_length=MAX_INPUT_TOKENS):
+    tokenizer, model = get_model()
+    encoding = tokenizer(note_text, return_tensors="pt", truncation=True, max_length=max_length)
     input_ids = encoding["input_ids"].to(device)
     attention_mask = encoding["attention_mask"].to(device)
 
-    output = model.generate(input_ids=input_ids, attention_mask=attention_mask, max_length=64)
+    output = model.generate(input_ids=input_ids, attention_mask=attention_mask, max_length=MAX_OUTPUT_TOKENS)
     decoded = tokenizer.decode(output[0], skip_special_tokens=True)
     return decoded.strip()
 
-def split_into_note_sections(text):
-    lines = text.splitlines()
-    sections = []
-    current_section = ""
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if current_section:
-                sections.append(current_section.strip())
-                current_section = ""
+def generate_flashcards_batch(notes, max_length=MAX_INPUT_TOKENS, max_batch_size=MAX_BATCH_SIZE, stats=None):
+    """
+    Generates one flashcard per note, batching notes of similar length together.
+    Notes are sorted by token length and split into buckets of at most max_batch_size,
+    each bucket is padded only to its longest note and decoded with a single
+    model.generate call. Results are returned in the same order as notes.
+    If stats is a dict, real and padded encoder token counts are added to it.
+    """
+    if not notes:
+        return []
+    tokenizer, model = get_model()
+    with tracing.span("tokenize"):
+        token_ids = tokenizer(list(notes), truncation=True, max_length=max_length)["input_ids"]
+    order = sorted(range(len(notes)), key=lambda i: len(token_ids[i]))
+
+    results = [None] * len(notes)
+    for start in range(0, len(order), max_batch_size):
+        bucket = order[start:start + max_batch_size]
+        with tracing.span("tokenize"):
+            encoding = tokenizer.pad({"input_ids": [token_ids[i] for i in bucket]}, return_tensors="pt")
+            input_ids = encoding["input_ids"].to(device)
+            attention_mask = encoding["attention_mask"].to(device)
+        if stats is not None:
+            stats["real_tokens"] = stats.get("real_tokens", 0) + int(attention_mask.sum())
+            stats["padded_tokens"] = stats.get("padded_tokens", 0) + input_ids.numel()
+            stats["max_length_tokens"] = stats.get("max_length_tokens", 0) + len(bucket) * max_length
+
+        with tracing.span("model_generate", batch_size=len(bucket)):
+            output = model.generate(input_ids=input_ids, attention_mask=attention_mask, max_length=MAX_OUTPUT_TOKENS)
+        with tracing.span("decode"):
+            decoded = tokenizer.batch_decode(output, skip_special_tokens=True)
+        tracing.count(input_tokens=int(attention_mask.sum()),
+                      output_tokens=int((output[:, 1:] != tokenizer.pad_token_id).sum()))
+        for i, text in zip(bucket, decoded):
+            results[i] = text.strip()
+    return results
+
+def generate_flashcards_cached(notes, generate_fn=None):
+    """
+    Returns generated text for each note, only running the model on notes whose
+    normalized text hasn't been seen with the current model and parameters.
+    generate_fn takes the list of uncached notes and defaults to generate_flashcards_batch.
+    """
+    generate_fn = generate_fn or generate_flashcards_batch
+    # Backends differ slightly in output (int8 especially), and retraining in place changes the weights
+    params = {"max_input_tokens": MAX_INPUT_TOKENS, "max_output_tokens": MAX_OUTPUT_TOKENS,
+              "backend": INFERENCE_BACKEND, "weights": current_weights_fingerprint()}
+    keys = [FlashcardCache.make_key(note, model_dir, params) for note in notes]
+    results = [flashcard_cache.get(key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    tracing.count(cached_sections=len(notes) - len(missing))
+    if missing:
+        generated = generate_fn([notes[i] for i in missing])
+        for i, output in zip(missing, generated):
+            flashcard_cache.put(keys[i], output)
+            results[i] = output
+    return results
+
+_weights_fingerprints = {}
+
+def current_weights_fingerprint():
+    # Computed once per model directory; reload_model forgets it, so retrained weights get new keys
+    fingerprint = _weights_fingerprints.get(model_dir)
+    if fingerprint is None:
+        fingerprint = _weights_fingerprints[model_dir] = weights_fingerprint(model_dir)
+    return fingerprint
+
+def count_tokens(text):
+    tokenizer, _ = get_model()
+    return len(tokenizer(text)["input_ids"])
+
+def split_overlong_sections(sections, max_length=MAX_INPUT_TOKENS):
+    """
+    Splits any section longer than max_length tokens into several shorter sections,
+    breaking at sentence boundaries where possible and at word boundaries otherwise,
+    so that no part of a long note is silently dropped by truncation.
+    """
+    result = []
+    for section in sections:
+        if count_tokens(section) <= max_length:
+            result.append(section)
             continue
-        if line.startswith(("-", "•")) or (line[:2].isdigit() and line[2:3] in [".", ")"]):
-            if current_section:
-                sections.append(current_section.strip())
-            current_section = line.lstrip("-• 0123456789.() ")
-        else:
-            current_section += " " + line
-    if current_section:
-        sections.append(current_section.strip())
+        pieces = []
+        for sentence in re.split(r"(?<=[.!?;])\s+", section):
+            if count_tokens(sentence) <= max_length:
+                pieces.append(sentence)
+            else:
+                pieces.extend(sentence.split())
+        current = ""
+        for piece in pieces:
+            candidate = f"{current} {piece}".strip()
+            if current and count_tokens(candidate) > max_length:
+                result.append(current)
+                current = piece
+            else:
+                current = candidate
+        if current:
+            result.append(current)
+    return result
+
+scheduler = None
+if USE_SCHEDULER:
+    scheduler = InferenceScheduler(generate_flashcards_batch, max_batch_size=MAX_BATCH_SIZE,
+                                   max_wait_ms=SCHEDULER_MAX_WAIT_MS).start()
+
+def prepare_sections(cleaned_text):
+    with tracing.span("split"):
+        sections = split_into_note_sections(cleaned_text)
+        if TRUNCATION_POLICY == "split":
+            sections = split_overlong_sections(sections)
+    tracing.count(sections=len(sections))
     return sections
 
+def generate_section_outputs(sections, stats=None):
+    if scheduler is not None:
+        return generate_flashcards_cached(sections, lambda notes: scheduler.submit(notes, stats=stats))
+    return generate_flashcards_cached(sections, lambda notes: generate_flashcards_batch(notes, stats=stats))
+
+def parse_flashcards(outputs, first_section=0):
+    """
+    Parses every section's output into flashcards. Outputs that yield no card (or a
+    broken one) are returned as failures with the section index and reason.
+    """
+    flashcards, failures = [], []
+    with tracing.span("parse"):
+        for section, output in enumerate(outputs, first_section):
+            parsed = qa_parser.parse(output)
+            flashcards.extend(parsed["cards"])
+            failures.extend(dict(failure, section=section) for failure in parsed["failures"])
+    return flashcards, failures
+
+def iter_flashcard_batches(sections, batch_size=MAX_BATCH_SIZE):
+    """
+    Generates flashcards batch by batch, yielding (sections_done, flashcards, failures)
+    as soon as each batch of sections has been through the model.
+    """
+    for start in range(0, len(sections), batch_size):
+        batch = sections[start:start + batch_size]
+        yield (start + len(batch),) + parse_flashcards(generate_section_outputs(batch), first_section=start)
+
+def run_flashcard_pipeline(job_input, report):
+    """
+    Job version of /generate: OCR, cleaning, section splitting and generation run as
+    separate stages, and flashcards are reported after every batch of sections.
+    With "filenames", every page is transcribed (concurrently) and all of them are
+    turned into one deck.
+    """
+    start = time.perf_counter()
+    filenames = job_input.get("filenames") or ([job_input["filename"]] if job_input.get("filename") else [])
+    cleaned_text = job_input.get("text")
+    page_errors = []
+    if not cleaned_text:
+        report("ocr", pages=len(filenames))
+        filepaths = [os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(name)) for name in filenames]
+        with tracing.span("ocr"):
+            pages = describe_images(filepaths)
+        report("clean")
+        page_texts = []
+        for page, (raw_text, error) in enumerate(pages):
+            if error is not None:
+                page_errors.append({"page": page, "filename": filenames[page], "error": error})
+            else:
+                page_texts.append(clean_extracted_text(raw_text))
+        cleaned_text = "\n\n".join(page_texts)
+
+    report("split", notes=cleaned_text)
+    sections = prepare_sections(cleaned_text)
+
+    flashcards, failures = [], []
+    report("generate", sections_total=len(sections), sections_done=0, flashcards=flashcards, failures=failures)
+    for sections_done, batch_flashcards, batch_failures in iter_flashcard_batches(sections):
+        flashcards.extend(batch_flashcards)
+        failures.extend(batch_failures)
+        report("generate", sections_done=sections_done, flashcards=flashcards, failures=failures)
+
+    result = {"flashcards": flashcards, "failures": failures}
+    if filenames:
+        result.update(page_errors=page_errors, pages_per_sec=len(filenames) / (time.perf_counter() - start))
+    return result
+
+job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """
+    Creates the job store and manager on first use and picks up the jobs a previous
+    server left unfinished. Only a process that serves requests should call this, so
+    the debug reloader's watcher process never claims jobs.
+    """
+    global job_manager
+    with _job_manager_lock:
+        if job_manager is None:
+            job_store = SQLiteJobStore(JOB_DB_PATH) if JOB_DB_PATH else InMemoryJobStore()
+            job_manager = JobManager(job_store, run_flashcard_pipeline, max_workers=JOB_WORKERS,
+                                     trace_name=lambda job_input: "job_upload_batch" if "filenames" in job_input
+                                     else "job")
+            # Under serve.py the parent requeues abandoned jobs; a worker only picks up queued ones
+            job_manager.resume_unfinished(requeue_running=os.getenv("FLASHCARDS_SERVE_WORKER") != "1")
+        return job_manager
+
+@app.before_request
+def start_request_trace():
+    g.trace, g.trace_token = tracing.start_trace(request.endpoint or "unknown")
+
+@app.after_request
+def defer_streamed_trace(response):
+    # Streamed responses are generated after the view returns, so their trace ends when the stream is closed
+    if response.is_streamed and "trace" in g:
+        trace = g.pop("trace")
+        response.call_on_close(lambda: tracing.finish_trace(trace))
+    return response
+
+@app.teardown_request
+def finish_request_trace(exc):
+    token = g.pop("trace_token", None)
+    if "trace" in g:
+        tracing.finish_trace(g.pop("trace"), token)
+    elif token is not None:
+        tracing.detach_trace(token)
+
 # API Routes
 
 @app.route('/upload', methods=['POST'])
@@ -66,18 +411,36 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'Empty filename'}), 400
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        file.save(filepath)
+        filename = store_upload(file.read(), file.filename)
         return jsonify({'filename': filename})
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """
+    Takes many images (and/or zips of images) as "files" in one request, stores them
+    content-addressed and starts one job that turns all pages into a single deck.
+    Poll /jobs/<job_id> for progress, per-stage timings and pages/sec.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    try:
+        pages = [{'name': name, 'filename': store_upload(data, name)}
+                 for name, data in iter_uploaded_pages(files)]
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    if not pages:
+        return jsonify({'error': 'No images found'}), 400
+    job_id = get_job_manager().submit({'filenames': [page['filename'] for page in pages]})
+    return jsonify({'job_id': job_id, 'pages': pages}), 202
+
 @app.route('/review/<filename>', methods=['GET'])
 def review_notes(filename):
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     try:
-        raw_text = describe_image_with_gpt4(filepath)
+        with tracing.span("ocr"):
+            raw_text = describe_image_with_gpt4(filepath)
         cleaned_text = clean_extracted_text(raw_text)
         return jsonify({'notes': cleaned_text})
     except Exception as e:
@@ -90,18 +453,138 @@ def generate_flashcards(filename):
         cleaned_text = text_override
     else:
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        raw_text = describe_image_with_gpt4(filepath)
+        with tracing.span("ocr"):
+            raw_text = describe_image_with_gpt4(filepath)
         cleaned_text = clean_extracted_text(raw_text)
 
-    sections = split_into_note_sections(cleaned_text)
-    flashcards = []
-    for note in sections:
-        qa = generate_flashcard(note)
-        if qa.startswith("Q:") and "A:" in qa:
-            q = qa.split("Q:", 1)[1].split("A:", 1)[0].strip()
-            a = qa.split("A:", 1)[1].strip()
-            flashcards.append({"question": q, "answer": a})
-    return jsonify({'flashcards': flashcards})
+    sections = prepare_sections(cleaned_text)
+    token_stats = {}
+    flashcards, failures = parse_flashcards(generate_section_outputs(sections, stats=token_stats))
+    app.logger.info("Generated %d flashcards (%d unparseable) from %d sections, encoder tokens: %d real / %d padded "
+                    "(%d at max_length)", len(flashcards), len(failures), len(sections),
+                    round(token_stats.get("real_tokens", 0)), round(token_stats.get("padded_tokens", 0)),
+                    round(token_stats.get("max_length_tokens", 0)))
+    return jsonify({'flashcards': flashcards, 'failures': failures})
+
+@app.route('/generate_stream/<filename>', methods=['GET'])
+def generate_flashcards_stream(filename):
+    """
+    Streaming variant of /generate. Each flashcard (or failure, for output that couldn't
+    be parsed) is sent as soon as its batch of sections finishes, followed by a summary
+    with timings. Sends Server-Sent Events
+    by default, or newline-delimited JSON with ?format=ndjson.
+    """
+    text_override = request.args.get('text')
+    ndjson = request.args.get('format') == 'ndjson'
+
+    def event(name, data):
+        if ndjson:
+            return json.dumps({"event": name, "data": data}) + "\n"
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def stream():
+        start = time.perf_counter()
+        timings = {}
+        if text_override:
+            cleaned_text = text_override
+        else:
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            with tracing.span("ocr"):
+                raw_text = describe_image_with_gpt4(filepath)
+            cleaned_text = clean_extracted_text(raw_text)
+            timings["ocr"] = time.perf_counter() - start
+
+        sections = prepare_sections(cleaned_text)
+        generate_start = time.perf_counter()
+        count = failed = 0
+        for _, flashcards, failures in iter_flashcard_batches(sections):
+            for card in flashcards:
+                count += 1
+                timings.setdefault("first_flashcard", time.perf_counter() - start)
+                yield event("flashcard", card)
+            for failure in failures:
+                failed += 1
+                yield event("failure", failure)
+        timings["generate"] = time.perf_counter() - generate_start
+        timings["total"] = time.perf_counter() - start
+        yield event("summary", {"flashcards": count, "failures": failed, "sections": len(sections),
+                                "timings": timings})
+
+    mimetype = "application/x-ndjson" if ndjson else "text/event-stream"
+    return Response(stream_with_context(tracing.traced_iter(stream())), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # The process is up and serving requests, whether or not the model is loaded
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Only ready once the model is loaded and warmed up
+    if not model_ready:
+        return jsonify({'status': 'loading', 'startup_timings': startup_timings}), 503
+    return jsonify({'status': 'ready', 'startup_timings': startup_timings})
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    payload = request.get_json(silent=True) or request.form
+    filename = payload.get('filename')
+    text = payload.get('text')
+    if not filename and not text:
+        return jsonify({'error': 'Provide a filename or text'}), 400
+    job_id = get_job_manager().submit({'filename': filename, 'text': text})
+    return jsonify({'job_id': job_id}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    if scheduler is None:
+        return jsonify({'error': 'Scheduler is disabled'}), 404
+    return jsonify(scheduler.stats())
+
+@app.route('/flashcard_cache/stats', methods=['GET'])
+def flashcard_cache_stats():
+    return jsonify(flashcard_cache.stats())
+
+@app.route('/ocr/stats', methods=['GET'])
+def ocr_stats():
+    # Pages sent to the vision API, bytes before and after preprocessing, and coalesced duplicates
+    return jsonify(hand_to_text.ocr_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Request, per-stage, section and token histograms in the Prometheus text format, for
+    # requests and background jobs. They live in this process only: under serve.py each
+    # worker keeps its own and a scrape is answered by whichever worker accepts it
+    return Response(tracing.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/ocr_cache/stats', methods=['GET'])
+def ocr_cache_stats():
+    if hand_to_text.ocr_cache is None:
+        return jsonify({'error': 'OCR cache is disabled'}), 404
+    return jsonify(hand_to_text.ocr_cache.stats())
+
+# Set FLASHCARDS_PRELOAD=1 to load and warm up the model in the background as soon as
+# the module is imported, e.g. when served by a WSGI server instead of app.run
+PRELOAD = os.getenv("FLASHCARDS_PRELOAD", "0") == "1"
+if PRELOAD:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+# Imported by a WSGI server or a serve.py worker, this process serves requests, so resume jobs right away
+if __name__ != '__main__':
+    get_job_manager()
 
 if __name__ == '__main__':
+    # With debug=True the reloader re-runs this file in a child process; only that one serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_job_manager()
+        if not PRELOAD:
+            threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
     app.run(debug=True)
@@ -1,121 +1,200 @@
+import json
+import math
+import os
+import random
+import sys
+import numpy as np
 import torch
-from torch.utils.data import DataLoader, Dataset, random_split
+from torch.utils.data import BatchSampler, DataLoader, RandomSampler, random_split
 from torch.utils.tensorboard import SummaryWriter
 from torch.optim import AdamW
 from transformers import T5Tokenizer, T5ForConditionalGeneration, get_scheduler
-import json
 from tqdm import tqdm, trange
-import evaluate  # Replaces deprecated load_metric
-
-# FlashcardDataset Class
-class FlashcardDataset(Dataset):
-    def __init__(self, data_path, tokenizer_name, max_length=256):
-        with open(data_path, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        self.tokenizer = T5Tokenizer.from_pretrained(tokenizer_name)
-        self.max_length = max_length
-
-    def __len__(self):
-        return len(self.data)
-
-    def __getitem__(self, idx):
-        item = self.data[idx]
-        note = item['note']
-        qa = f"Q: {item['question']}\nA: {item['answer']}"
-        encoding = self.tokenizer(note, padding="max_length", truncation=True, max_length=self.max_length, return_tensors="pt")
-        target = self.tokenizer(qa, padding="max_length", truncation=True, max_length=self.max_length, return_tensors="pt")
-        return {
-            'input_ids': encoding['input_ids'].squeeze(),
-            'attention_mask': encoding['attention_mask'].squeeze(),
-            'labels': target['input_ids'].squeeze()
-        }
-
-# Settings
-model_name = "google/flan-t5-base"
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-epochs = 8
-batch_size = 4
-learning_rate = 5e-5
-validation_split = 0.1
-
-# Load tokenizer and model
-tokenizer = T5Tokenizer.from_pretrained(model_name)
-model = T5ForConditionalGeneration.from_pretrained(model_name).to(device)
-
-# Load full dataset
-full_dataset = FlashcardDataset("triviaqa_notes_generated.json", tokenizer_name=model_name)
-
-# Split into train and val
-val_size = int(len(full_dataset) * validation_split)
-train_size = len(full_dataset) - val_size
-train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size])
-
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=1)
-
-# Optimizer
-optimizer = AdamW(model.parameters(), lr=learning_rate)
-
-# Learning rate scheduler
-num_training_steps = epochs * len(train_loader)
-lr_scheduler = get_scheduler(
-    name="linear",
-    optimizer=optimizer,
-    num_warmup_steps=100,
-    num_training_steps=num_training_steps,
-)
-
-# TensorBoard writer
-writer = SummaryWriter("runs/flashcard_t5")
-
-# Training loop
-for epoch in trange(epochs, desc="Epochs"):
-    print(f"\n🔁 Epoch {epoch+1}/{epochs}")
-    model.train()
-    total_loss = 0
-
-    for step, batch in enumerate(tqdm(train_loader, desc="Training")):
-        input_ids = batch["input_ids"].to(device)
-        attention_mask = batch["attention_mask"].to(device)
-        labels = batch["labels"].to(device)
-        labels[labels == tokenizer.pad_token_id] = -100
-
-        outputs = model(input_ids=input_ids, attention_mask=attention_mask, labels=labels)
-        loss = outputs.loss
+from evaluate_model import evaluate_dataset
+from flashcard_data import (PretokenizedFlashcardDataset, DynamicPaddingCollator, TokenBudgetBatchSampler,
+                            ResumableBatchSampler, ensure_pretokenized)
+from checkpoints import save_checkpoint, latest_checkpoint, load_training_state
+
+CONFIG_PATH = "train_config.json"
+
+# The one list of settings and their defaults. A JSON file given on the command line (or
+# train_config.json, if it exists) only needs the settings it changes
+DEFAULT_CONFIG = {
+    "model_name": "google/flan-t5-base",
+    "data_path": "triviaqa_notes_generated.json",
+    "pretokenized_prefix": "triviaqa_notes_generated.tok",  # Token ids cached by flashcard_data.py
+    "output_dir": "finetuned_flan_t5_flashcards_v3",
+    "log_dir": "runs/flashcard_t5",
+    "seed": 42,
+    "epochs": 8,
+    "learning_rate": 5e-5,
+    "warmup_steps": 100,
+    "validation_split": 0.1,
+    "batch_size": 4,  # Examples per batch when max_tokens_per_batch is null
+    "max_tokens_per_batch": 1024,  # Padded (note + target) tokens per batch; batches are formed by length
+    "gradient_accumulation_steps": 1,  # Batches per optimizer step
+    "bf16": False,  # bfloat16 autocast for forward passes
+    "num_workers": 2,  # DataLoader worker processes
+    "intra_op_threads": None,  # torch.set_num_threads; null keeps torch's default
+    "inter_op_threads": None,  # torch.set_num_interop_threads; null keeps torch's default
+    "checkpoint_dir": "checkpoints/flashcard_t5",
+    "checkpoint_every_steps": 500,  # Optimizer steps between checkpoints; one is also saved every epoch
+    "keep_checkpoints": 2,
+    "resume": True,  # Continue from the latest checkpoint in checkpoint_dir if there is one
+    "eval_every_n_epochs": 1,  # The final epoch is always evaluated
+    "eval_subsample": None,  # Evaluate on a fixed random subset of the validation set instead of all of it
+    "eval_batch_size": 32,
+    "eval_max_length": 50,
+}
+
+
+def load_config(path=None):
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown settings in {path}: {', '.join(sorted(unknown))}")
+        config.update(overrides)
+    return config
+
+
+def set_seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def main(config=None):
+    if config is None:
+        config = load_config(sys.argv[1] if len(sys.argv) > 1 else CONFIG_PATH)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if config["intra_op_threads"]:
+        torch.set_num_threads(config["intra_op_threads"])
+    if config["inter_op_threads"]:
+        torch.set_num_interop_threads(config["inter_op_threads"])
+    set_seed(config["seed"])
+
+    resume_from = latest_checkpoint(config["checkpoint_dir"]) if config["resume"] else None
+
+    # Load tokenizer and model
+    tokenizer = T5Tokenizer.from_pretrained(config["model_name"])
+    model = T5ForConditionalGeneration.from_pretrained(resume_from or config["model_name"]).to(device)
+
+    # Load full dataset, tokenizing it only if the cached token ids are missing or stale
+    ensure_pretokenized(config["data_path"], config["model_name"], config["pretokenized_prefix"])
+    full_dataset = PretokenizedFlashcardDataset(config["pretokenized_prefix"], pad=False)
+    collate = DynamicPaddingCollator(tokenizer.pad_token_id)
+
+    # Split into train and val; seeded so a resumed run sees the same split
+    val_size = int(len(full_dataset) * config["validation_split"])
+    train_size = len(full_dataset) - val_size
+    train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size],
+                                              generator=torch.Generator().manual_seed(config["seed"]))
+
+    # Batch order depends only on (seed, epoch), so a resumed epoch can skip the batches it already did
+    # by index instead of loading them
+    num_workers = config["num_workers"]
+    shuffle_generator = torch.Generator()
+    epochs = config["epochs"]
+    if config["max_tokens_per_batch"]:
+        train_lengths = full_dataset.lengths()[train_dataset.indices]
+        batch_sampler = TokenBudgetBatchSampler(train_lengths, max_tokens=config["max_tokens_per_batch"],
+                                                seed=config["seed"])
+        epoch_batches = [batch_sampler.num_batches(epoch) for epoch in range(epochs)]
+    else:
+        batch_sampler = BatchSampler(RandomSampler(train_dataset, generator=shuffle_generator),
+                                     config["batch_size"], drop_last=False)
+        epoch_batches = [len(batch_sampler)] * epochs
+    train_sampler = ResumableBatchSampler(batch_sampler)
+    train_loader = DataLoader(train_dataset, batch_sampler=train_sampler, collate_fn=collate,
+                              num_workers=num_workers, persistent_workers=num_workers > 0)
+
+    # Optimizer
+    optimizer = AdamW(model.parameters(), lr=config["learning_rate"])
+
+    # Learning rate scheduler
+    # Token-budget batching gives every epoch a slightly different number of batches, so count them all
+    accumulation_steps = config["gradient_accumulation_steps"]
+    lr_scheduler = get_scheduler(
+        name="linear",
+        optimizer=optimizer,
+        num_warmup_steps=config["warmup_steps"],
+        num_training_steps=sum(math.ceil(batches / accumulation_steps) for batches in epoch_batches),
+    )
+
+    state = {"global_step": 0, "epoch": 0, "batches_done": 0, "epoch_loss": 0.0}
+    if resume_from:
+        state = load_training_state(resume_from, optimizer, lr_scheduler)
+        print(f"⏩ Resuming from {resume_from} (epoch {state['epoch'] + 1}, step {state['global_step']})")
+
+    def checkpoint():
+        save_checkpoint(config["checkpoint_dir"], model, tokenizer, optimizer, lr_scheduler, state,
+                        keep=config["keep_checkpoints"])
+
+    # TensorBoard writer
+    writer = SummaryWriter(config["log_dir"])
+
+    # Training loop
+    for epoch in trange(state["epoch"], epochs, desc="Epochs"):
+        print(f"\n🔁 Epoch {epoch+1}/{epochs}")
+        model.train()
+        num_batches = epoch_batches[epoch]
+        train_sampler.set_epoch(epoch, start=state["batches_done"])
+        shuffle_generator.manual_seed(config["seed"] + epoch)
 
         optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        lr_scheduler.step()
-
-        total_loss += loss.item()
-        writer.add_scalar("Loss/train", loss.item(), epoch * len(train_loader) + step)
-
-    avg_loss = total_loss / len(train_loader)
-    print(f"📉 Avg Training Loss: {avg_loss:.4f}")
-
-    # Evaluation
-    print("🔍 Evaluating...")
-    model.eval()
-    metric = evaluate.load("sacrebleu")
-    with torch.no_grad():
-        for batch in val_loader:
+        for step, batch in enumerate(tqdm(train_loader, desc="Training", initial=state["batches_done"],
+                                          total=num_batches), start=state["batches_done"]):
             input_ids = batch["input_ids"].to(device)
             attention_mask = batch["attention_mask"].to(device)
             labels = batch["labels"].to(device)
-
-            outputs = model.generate(input_ids=input_ids, attention_mask=attention_mask, max_length=50)
-            preds = tokenizer.batch_decode(outputs, skip_special_tokens=True)
-            refs = tokenizer.batch_decode(labels, skip_special_tokens=True)
-
-            metric.add_batch(predictions=preds, references=[[r] for r in refs])
-
-    score = metric.compute()["score"]
-    print(f"📝 BLEU Score: {score:.2f}")
-    writer.add_scalar("BLEU/score", score, epoch)
-
-# Save final model
-model.save_pretrained("finetuned_flan_t5_flashcards_v3")
-tokenizer.save_pretrained("finetuned_flan_t5_flashcards_v3")
-writer.close()
-print("✅ Model and tokenizer saved.")
+            labels[labels == tokenizer.pad_token_id] = -100
+
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=config["bf16"]):
+                outputs = model(input_ids=input_ids, attention_mask=attention_mask, labels=labels)
+            loss = outputs.loss
+            (loss / accumulation_steps).backward()
+
+            state["batches_done"] = step + 1
+            state["epoch_loss"] += loss.item()
+            writer.add_scalar("Loss/train", loss.item(), sum(epoch_batches[:epoch]) + step)
+
+            if state["batches_done"] % accumulation_steps == 0 or state["batches_done"] == num_batches:
+                optimizer.step()
+                lr_scheduler.step()
+                optimizer.zero_grad()
+                state["global_step"] += 1
+                if config["checkpoint_every_steps"] and state["global_step"] % config["checkpoint_every_steps"] == 0:
+                    checkpoint()
+
+        avg_loss = state["epoch_loss"] / num_batches
+        print(f"📉 Avg Training Loss: {avg_loss:.4f}")
+
+        # Evaluation
+        if (epoch + 1) % config["eval_every_n_epochs"] == 0 or epoch + 1 == epochs:
+            print("🔍 Evaluating...")
+            results = evaluate_dataset(model, tokenizer, val_dataset, device, batch_size=config["eval_batch_size"],
+                                       max_length=config["eval_max_length"], subsample=config["eval_subsample"])
+            timings = ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in results["timings"].items())
+            print(f"📝 BLEU Score: {results['bleu']:.2f}  Exact match Q/A: "
+                  f"{results['exact_match_question']:.2%} / {results['exact_match_answer']:.2%}  ({timings})")
+            writer.add_scalar("BLEU/score", results["bleu"], epoch)
+            writer.add_scalar("ExactMatch/question", results["exact_match_question"], epoch)
+            writer.add_scalar("ExactMatch/answer", results["exact_match_answer"], epoch)
+
+        # A run resumed from here starts at the beginning of the next epoch
+        state.update(epoch=epoch + 1, batches_done=0, epoch_loss=0.0)
+        checkpoint()
+
+    # Save final model
+    model.save_pretrained(config["output_dir"])
+    tokenizer.save_pretrained(config["output_dir"])
+    writer.close()
+    print("✅ Model and tokenizer saved.")
+
+
+# Guarded so DataLoader worker processes can import this module without re-running training
+if __name__ == "__main__":
+    main()
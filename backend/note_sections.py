@@ -0,0 +1,24 @@
+def split_into_note_sections(text):
+    """
+    Splits notes into sections, one per paragraph or bullet/numbered item, each of
+    which becomes one model input.
+    """
+    lines = text.splitlines()
+    sections = []
+    current_section = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if current_section:
+                sections.append(current_section.strip())
+                current_section = ""
+            continue
+        if line.startswith(("-", "•")) or (line[:2].isdigit() and line[2:3] in [".", ")"]):
+            if current_section:
+                sections.append(current_section.strip())
+            current_section = line.lstrip("-• 0123456789.() ")
+        else:
+            current_section += " " + line
+    if current_section:
+        sections.append(current_section.strip())
+    return sections
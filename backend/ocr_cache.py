@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+import time
+
+
+class OCRCache:
+    """
+    Persistent cache of cleaned OCR transcriptions.
+
+    Entries are stored as one text file per key under cache_dir. The key is a hash of
+    the image bytes plus the prompt and model used, so changing either invalidates old
+    entries. A file's mtime is bumped on every hit, and when the directory grows past
+    max_bytes the least recently used files are deleted first, down to evict_to of it.
+
+    cache_dir is only created by the first put. Its size is counted once, on the first
+    put, and then kept up to date as entries are written; the directory is only scanned
+    again when that count passes max_bytes. Other processes sharing cache_dir aren't
+    counted until then, so the directory can briefly exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir="ocr_cache", max_bytes=64 * 1024 * 1024, evict_to=0.9):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evict_to = evict_to
+        self._lock = threading.Lock()
+        self._dir_ready = False
+        self._total_bytes = None  # Size of the entries in cache_dir; None until the first put
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(image_bytes, prompt, model):
+        digest = hashlib.sha256(image_bytes)
+        digest.update(b"\0" + prompt.encode("utf-8") + b"\0" + model.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key):
+        start = time.perf_counter()
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            text = None
+        with self._lock:
+            self.lookup_seconds += time.perf_counter() - start
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put(self, key, text, miss_seconds=0.0):
+        if not self._dir_ready:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._dir_ready = True
+        path = self._path(key)
+        data = text.encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.miss_seconds += miss_seconds
+            if self._total_bytes is None:
+                self._evict()
+            else:
+                self._total_bytes += len(data) - replaced
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        # Recounts the directory from scratch, so sizes that drifted (other processes) are corrected too
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".txt"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * self.evict_to:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._total_bytes = total
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".txt"):
+                os.remove(entry.path)
+        with self._lock:
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+                "avg_miss_ms": self.miss_seconds / self.misses * 1000 if self.misses else 0.0,
+            }
@@ -0,0 +1,112 @@
+import re
+
+# Why an output produced no card (or fewer cards than it should have)
+EMPTY = "empty"                        # Blank output
+NO_MARKERS = "no_markers"              # No Q:/A: markers anywhere
+MISSING_ANSWER = "missing_answer"      # A question with no answer after it
+MISSING_QUESTION = "missing_question"  # An answer with no question before it
+EMPTY_QUESTION = "empty_question"      # "Q:" followed directly by "A:"
+EMPTY_ANSWER = "empty_answer"          # "A:" with nothing after it
+
+# Q:, Q1:, Question:, A:, A1:, Answer:, with ASCII or full-width colons. The leading
+# lookahead lets the regex engine skip positions that can't start a marker cheaply
+_MARKER = re.compile(r"(?=[QqAa])\b(?:(?P<q>Q\d*|(?i:question)\s*\d*)|(?P<a>A\d*|(?i:answer)\s*\d*))\s*[:\uFF1A]")
+_LINES = re.compile(r"[^\r\n]+")
+# A marker after one of these (or at the start of the text) always starts a field
+_BOUNDARY = "\r\n.?!\u3002\uFF1F\uFF01"
+
+
+def _failure(reason, text, question=None, answer=None):
+    return {"reason": reason, "question": question or None, "answer": answer or None, "text": text}
+
+
+def _markers(text):
+    # Markers at the start of a line or a sentence are always taken. Elsewhere (after
+    # plain whitespace, as in "A1: Water Q2: ...") only a question after an answer or an
+    # answer after a question is, so "A: Vitamin A: found in carrots" stays one answer
+    markers = []
+    for marker in _MARKER.finditer(text):
+        i = marker.start() - 1
+        while i >= 0 and text[i] in " \t":
+            i -= 1
+        if i >= 0 and text[i] not in _BOUNDARY:
+            is_question = marker.group("q") is not None
+            after_question = bool(markers) and markers[-1].group("q") is not None
+            # The first marker may be a question (after a preamble), but never an answer
+            if is_question == after_question or not markers and not is_question:
+                continue
+        markers.append(marker)
+    return markers
+
+
+def _fallback(text):
+    # For outputs without markers: the first line ending in "?" is the question and
+    # the first other line longer than one character is the answer
+    question = answer = None
+    for line in _LINES.findall(text):
+        line = line.strip()
+        if question is None and line.endswith("?"):
+            question = line
+        elif answer is None and not line.endswith("?") and len(line) > 1:
+            answer = line
+    return question, answer
+
+
+def parse(text, fallback=False):
+    """
+    Parses model output into flashcards in one pass over its Q/A markers.
+
+    Handles "Q:"/"A:", "Question:"/"Answer:", numbered markers and full-width colons,
+    and any number of cards per output. Text before the first marker is ignored, and
+    a marker in the middle of a line only counts where it starts the next field.
+    Returns {"cards": [{"question", "answer"}, ...], "failures": [...]}, where each
+    failure has a reason (one of the constants above), whatever question or answer
+    text was found, and the text it came from, instead of the card being dropped.
+    With fallback=True, output without markers is parsed with line heuristics.
+    """
+    cards, failures = [], []
+    if not text or not text.strip():
+        return {"cards": cards, "failures": [_failure(EMPTY, text or "")]}
+
+    markers = _markers(text)
+    if not markers:
+        question, answer = _fallback(text) if fallback else (None, None)
+        if question and answer:
+            cards.append({"question": question, "answer": answer})
+        else:
+            failures.append(_failure(NO_MARKERS, text, question, answer))
+        return {"cards": cards, "failures": failures}
+
+    pending = None  # (question, start offset) of a question still waiting for its answer
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        segment = text[marker.end():end].strip()
+        if marker.group("q") is not None:
+            if pending is not None:
+                failures.append(_failure(MISSING_ANSWER, text[pending[1]:marker.start()].strip(), pending[0]))
+            pending = (segment, marker.start())
+            continue
+
+        if pending is None:
+            failures.append(_failure(MISSING_QUESTION, text[marker.start():end].strip(), answer=segment))
+        elif not pending[0]:
+            failures.append(_failure(EMPTY_QUESTION, text[pending[1]:end].strip(), answer=segment))
+        elif not segment:
+            failures.append(_failure(EMPTY_ANSWER, text[pending[1]:end].strip(), pending[0]))
+        else:
+            cards.append({"question": pending[0], "answer": segment})
+        pending = None
+
+    if pending is not None:
+        failures.append(_failure(MISSING_ANSWER, text[pending[1]:].strip(), pending[0]))
+    return {"cards": cards, "failures": failures}
+
+
+def first_qa(text):
+    """(question, answer) of the first card in text, or the partial fields of the first failure."""
+    result = parse(text)
+    if result["cards"]:
+        card = result["cards"][0]
+        return card["question"], card["answer"]
+    failure = result["failures"][0]
+    return failure["question"], failure["answer"]
@@ -0,0 +1,106 @@
+"""
+Pre-fork multi-worker server for main_backend.
+
+The parent process binds the listening socket and forks the workers; every worker
+loads the model itself, but the eager backend maps the safetensors weights
+copy-on-write, so all workers share one read-only copy through the page cache.
+torch's intra-op threads are split between workers so they don't oversubscribe
+the CPU.
+
+Jobs (/jobs, /upload_batch) must be visible to every worker, so they are kept in a
+shared SQLite database (FLASHCARDS_JOB_DB, jobs.db by default here). Each job is
+claimed by exactly one worker; the parent requeues jobs left running by a previous
+server at startup, and a dead worker's jobs before its replacement starts.
+/metrics only covers the worker that answered the scrape, since the histograms are
+kept per process; run a single worker where complete numbers are needed.
+
+Usage: python serve.py [--workers N] [--threads-per-worker T] [--host HOST] [--port PORT]
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+from jobs import SQLiteJobStore
+
+
+def run_worker(sock, threads):
+    os.environ["FLASHCARDS_SERVE_WORKER"] = "1"
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from werkzeug.serving import make_server
+    import main_backend
+
+    main_backend.warm_up()
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, main_backend.app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+
+def spawn_worker(sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_worker(sock, threads)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve main_backend with several pre-forked workers")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("FLASHCARDS_WORKERS", "2")))
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch intra-op threads per worker (default: CPU count / workers)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    job_db = os.environ.setdefault("FLASHCARDS_JOB_DB", "jobs.db")
+    job_store = SQLiteJobStore(job_db)
+    job_store.requeue_running()
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    sock.set_inheritable(True)
+
+    workers = {spawn_worker(sock, threads) for _ in range(args.workers)}
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {args.workers} workers x {threads} threads", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Restart workers that die until asked to stop
+    while workers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        job_store.requeue_running(owner=pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited, restarting", flush=True)
+            time.sleep(1)
+            workers.add(spawn_worker(sock, threads))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
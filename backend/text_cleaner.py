@@ -0,0 +1,85 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+
+MAX_PASSES = 8  # Bound on re-cleaning, in case a configured replacement keeps changing the text
+_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}
+_LINE_BREAK = re.compile(r"[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+class TextCleaner:
+    """
+    Strips model preambles ("Sure, here is the extracted text...") and markup from
+    OCR output, driven by a rules table (see clean_rules.json).
+
+    The rules are compiled once: drop phrases are lower-cased, and phrases containing
+    another phrase are pruned, since the shorter one already matches every line they
+    would. Only leading lines are treated as preamble: while the first line contains
+    a phrase it is dropped, so a note line that happens to say "here is the extracted
+    text" further down is kept. If the first line has no phrase, the fallback regex
+    substitutions are applied in order instead, each skipped when its (case-sensitive)
+    "requires" literal is absent. Cleaning repeats until nothing changes, so
+    clean(clean(x)) == clean(x). Recent outputs are remembered, so cleaning
+    already-cleaned text is a dictionary lookup. Safe to share between threads.
+    """
+
+    def __init__(self, drop_phrases, fallback_rules=(), remember=64):
+        lowered = {phrase.lower() for phrase in drop_phrases if phrase}
+        self.phrases = sorted(phrase for phrase in lowered
+                              if not any(other != phrase and other in phrase for other in lowered))
+        self.fallback_rules = []
+        for rule in fallback_rules:
+            flags = 0
+            for flag in rule.get("flags", ""):
+                flags |= _FLAGS[flag]
+            self.fallback_rules.append((re.compile(rule["pattern"], flags), rule.get("replacement", ""),
+                                        rule.get("requires")))
+        self.remember = remember
+        self._clean_outputs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        return cls(rules.get("drop_phrases", []), rules.get("fallback_rules", []))
+
+    def _drop_preamble(self, text):
+        # Returns the text after its first line if that line is preamble, else None
+        line_break = _LINE_BREAK.search(text)
+        first_line = (text if line_break is None else text[:line_break.start()]).lower()
+        if not any(phrase in first_line for phrase in self.phrases):
+            return None
+        if line_break is None:
+            return ""
+        # Same line-ending normalization as splitlines() + "\n".join()
+        return "\n".join(text[line_break.end():].splitlines()).strip()
+
+    def _clean_once(self, text):
+        dropped = self._drop_preamble(text)
+        if dropped is not None:
+            return dropped
+        for pattern, replacement, requires in self.fallback_rules:
+            if requires is None or requires in text:
+                text = pattern.sub(replacement, text)
+        return text.strip()
+
+    def clean(self, raw_text):
+        with self._lock:
+            if raw_text in self._clean_outputs:
+                self._clean_outputs.move_to_end(raw_text)
+                return raw_text
+        text = raw_text.strip()
+        for _ in range(MAX_PASSES):
+            cleaned = self._clean_once(text)
+            if cleaned == text:
+                break
+            text = cleaned
+        if self.remember:
+            with self._lock:
+                self._clean_outputs[text] = None
+                self._clean_outputs.move_to_end(text)
+                if len(self._clean_outputs) > self.remember:
+                    self._clean_outputs.popitem(last=False)
+        return text
@@ -0,0 +1,331 @@
+import bisect
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Bucket upper bounds; "+Inf" is added when rendering
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Histogram:
+    """A Prometheus-style histogram, one set of buckets per combination of label values."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(s["counts"]), s["sum"]) for key, s in sorted(self._series.items())]
+        for key, counts, total in series:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = ",".join(labels + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    def __init__(self):
+        self._histograms = []
+
+    def histogram(self, name, help_text, label_names=(), buckets=SECONDS_BUCKETS):
+        histogram = Histogram(name, help_text, label_names, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(line for histogram in self._histograms for line in histogram.render()) + "\n"
+
+
+metrics = Metrics()
+request_seconds = metrics.histogram("flashcards_request_seconds", "Time to serve a request.", ["endpoint"])
+stage_seconds = metrics.histogram("flashcards_stage_seconds",
+                                  "Time spent in each stage of a request, summed over the request.",
+                                  ["endpoint", "stage"])
+request_sections = metrics.histogram("flashcards_request_sections", "Note sections per request.", ["endpoint"],
+                                     COUNT_BUCKETS)
+request_tokens = metrics.histogram("flashcards_request_tokens", "Model tokens per request.", ["endpoint", "kind"],
+                                   COUNT_BUCKETS)
+
+_trace_ids = itertools.count(1)
+_current = contextvars.ContextVar("flashcards_trace", default=None)
+_depth = contextvars.ContextVar("flashcards_span_depth", default=0)
+
+
+class Trace:
+    """
+    Timings of one request. Spans are (name, start offset, seconds, depth, attrs)
+    tuples; nested spans overlap their parents. Counts such as tokens and sections
+    are summed in counts; use add() since pool threads may record concurrently.
+    """
+
+    def __init__(self, name):
+        self.id = next(_trace_ids)
+        self.name = name
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, amounts):
+        with self._lock:
+            self.counts.update(amounts)
+
+    def stage_seconds(self):
+        totals = Counter()
+        for name, _, seconds, _, _ in self.spans:
+            totals[name] += seconds
+        return totals
+
+    def counts_snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "seconds": self.seconds,
+            "stages": dict(self.stage_seconds()),
+            "counts": self.counts_snapshot(),
+            "spans": [{"name": name, "start": start, "seconds": seconds, "depth": depth, **attrs}
+                      for name, start, seconds, depth, attrs in self.spans],
+        }
+
+
+def start_trace(name):
+    """Starts a trace for the current request; returns it and the token finish_trace needs."""
+    trace = Trace(name)
+    if profiler is not None:
+        profiler.begin(trace)
+    return trace, _current.set(trace)
+
+
+def detach_trace(token):
+    """Stops recording into the current trace on this thread, without ending it."""
+    _current.reset(token)
+
+
+def finish_trace(trace, token=None):
+    """
+    Ends a trace, records it in the histograms and hands it to the profiler, if
+    enabled. Pass token to also detach it, if that hasn't been done already.
+    """
+    trace.seconds = time.perf_counter() - trace.start
+    if token is not None:
+        detach_trace(token)
+    request_seconds.observe(trace.seconds, endpoint=trace.name)
+    for stage, seconds in trace.stage_seconds().items():
+        stage_seconds.observe(seconds, endpoint=trace.name, stage=stage)
+    counts = trace.counts_snapshot()
+    if "sections" in counts:
+        request_sections.observe(counts["sections"], endpoint=trace.name)
+    for kind in ("input", "output"):
+        if f"{kind}_tokens" in counts:
+            request_tokens.observe(counts[f"{kind}_tokens"], endpoint=trace.name, kind=kind)
+    if profiler is not None:
+        profiler.end(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def recording(trace):
+    """Makes trace current for the enclosed block, e.g. for work done on behalf of several requests."""
+    token, depth_token = _current.set(trace), _depth.set(0)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        _depth.reset(depth_token)
+
+
+def add_span(trace, name, start, end, **attrs):
+    """Records a stage that ran between perf_counter times start and end, e.g. on another thread."""
+    trace.spans.append((name, start - trace.start, end - start, 0, attrs))
+
+
+def merge(trace, source, share=1.0):
+    """
+    Adds the spans of source, a trace of work shared with other requests, to trace, and
+    share of its counts.
+    """
+    for name, start, seconds, depth, attrs in source.spans:
+        trace.spans.append((name, source.start + start - trace.start, seconds, depth, attrs))
+    trace.add({name: amount * share for name, amount in source.counts_snapshot().items()})
+
+
+@contextmanager
+def span(name, **attrs):
+    """Times the enclosed block as a stage of the current request. Does nothing outside a request."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    depth = _depth.get()
+    depth_token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(depth_token)
+        trace.spans.append((name, start - trace.start, time.perf_counter() - start, depth, attrs))
+
+
+def count(**amounts):
+    """Adds to the current request's counts (e.g. input_tokens=..., sections=...)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(amounts)
+
+
+def traced(fn):
+    """Wraps fn so that, run on another thread, it still records into the calling request's trace."""
+    trace, depth = _current.get(), _depth.get()
+
+    def run(*args, **kwargs):
+        token, depth_token = _current.set(trace), _depth.set(depth)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            _depth.reset(depth_token)
+    return run
+
+
+def traced_iter(iterable):
+    """Iterates iterable with the calling request's trace current, for responses streamed after the view returns."""
+    trace, depth = _current.get(), _depth.get()
+
+    def run():
+        iterator = iter(iterable)
+        while True:
+            token, depth_token = _current.set(trace), _depth.set(depth)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+                _depth.reset(depth_token)
+            yield item
+    return run()
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread serving a traced request each interval seconds
+    and keeps the samples of the keep slowest requests on disk, as folded stacks
+    ("outer;inner count" per line, for flamegraph.pl or speedscope) plus the request's
+    trace as JSON. Only the request's own thread is sampled.
+    """
+
+    def __init__(self, out_dir, interval=0.005, keep=10):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.keep = keep
+        self._active = {}  # Trace id -> (thread id, Counter of folded stacks)
+        self._slowest = []  # Min-heap of (seconds, trace id, path without suffix)
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(out_dir, exist_ok=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def begin(self, trace):
+        with self._lock:
+            self._active[trace.id] = (threading.get_ident(), Counter())
+
+    def end(self, trace):
+        with self._lock:
+            entry = self._active.pop(trace.id, None)
+            if entry is None:
+                return
+            if len(self._slowest) >= self.keep and trace.seconds <= self._slowest[0][0]:
+                return
+        stacks = entry[1]
+        base = os.path.join(self.out_dir, f"{trace.seconds * 1000:08.0f}ms-{trace.name}-{trace.id}")
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, samples in stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(dict(trace.to_dict(), samples=sum(stacks.values()), interval=self.interval), f, indent=2)
+        with self._lock:
+            heapq.heappush(self._slowest, (trace.seconds, trace.id, base))
+            evicted = heapq.heappop(self._slowest) if len(self._slowest) > self.keep else None
+        if evicted:
+            for suffix in (".folded", ".json"):
+                try:
+                    os.remove(evicted[2] + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.values():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_fold(frame)] += 1
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+profiler = None
+
+
+def enable_profiler(out_dir, interval=0.005, keep=10):
+    global profiler
+    profiler = SamplingProfiler(out_dir, interval, keep).start()
+    return profiler